@@ -0,0 +1,167 @@
+import pandas as pd
+
+# Declared column types of the mapped catalog. Columns that are not listed here
+# (e.g. the dynamic 'variant:optionValueX' columns) are stored as strings.
+#   'string'   - free text, nullable
+#   'category' - low-cardinality text, dictionary-encoded
+#   'float'    - nullable float64
+#   'int'      - nullable int64
+#   'bool'     - nullable boolean
+CATALOG_SCHEMA = {
+    'price': 'float',
+    'taxCategory': 'category',
+    'stockOnHand': 'int',
+    'trackInventory': 'bool',
+    'product:brand': 'category',
+    'product:warranty': 'category',
+    'product:boardCategory': 'category',
+    'product:terrain': 'category',
+    'product:camberProfile': 'category',
+    'product:profile': 'category',
+    'product:baseProfile': 'category',
+    'product:rider': 'category',
+    'product:taperProfile': 'category',
+    'product:bindingSize': 'category',
+    'product:bindingMount': 'category',
+    'product:edges': 'category',
+    'product:sidewall': 'category',
+    'product:core': 'category',
+    'product:layup1': 'category',
+    'product:layup2': 'category',
+    'product:layup3': 'category',
+    'product:boardbase': 'category',
+    'variant:descriptionTab1Label': 'category',
+    'variant:descriptionTab1Visible': 'bool',
+    'variant:noseWidth': 'float',
+    'variant:waistWidth': 'float',
+    'variant:tailWidth': 'float',
+    'variant:taper': 'float',
+    'variant:boardWidth': 'category',
+    'variant:bootLengthMax': 'float',
+    'variant:effectiveEdge': 'float',
+    'variant:averageSidecutRadius': 'category',
+    'variant:setback': 'float',
+    'variant:stanceMin': 'float',
+    'variant:stanceMax': 'float',
+    'variant:weightKg': 'float',
+    'variant:bindingSizeVariant': 'category',
+    'variant:riderLengthMin': 'float',
+    'variant:riderLengthMax': 'float',
+    'variant:riderWeightMin': 'float',
+    'variant:riderWeightMax': 'float',
+}
+
+# Option tab columns follow a fixed pattern per tab and bar
+for _tab, _bars in ((1, 2), (2, 3)):
+    CATALOG_SCHEMA[f'variant:optionTab{_tab}Label'] = 'category'
+    CATALOG_SCHEMA[f'variant:optionTab{_tab}Visible'] = 'bool'
+    for _bar in range(1, _bars + 1):
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}Name'] = 'category'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}Visible'] = 'bool'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}Min'] = 'float'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}Max'] = 'float'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}MinLabel'] = 'category'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}MaxLabel'] = 'category'
+        CATALOG_SCHEMA[f'variant:optionTab{_tab}Bar{_bar}Rating'] = 'float'
+
+PANDAS_DTYPES = {
+    'string': 'string',
+    'category': 'category',
+    'float': 'Float64',
+    'int': 'Int64',
+    'bool': 'boolean',
+}
+
+
+def column_type(column):
+    return CATALOG_SCHEMA.get(column, 'string')
+
+
+def _coerce_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ['true', '1', 'yes']
+    return bool(value)
+
+
+def apply_schema(frame):
+    """
+    Converts the loosely typed mapped rows (empty strings for missing values, and
+    'True'/'False' strings for flags when read back from CSV) into the declared
+    column types.
+
+    Args:
+        frame (pd.DataFrame): Mapped catalog as built from the row dictionaries.
+
+    Returns:
+        pd.DataFrame: A new DataFrame with nullable, typed columns.
+    """
+    typed = {}
+    for column in frame.columns:
+        kind = column_type(column)
+        series = frame[column].mask(frame[column].isin(['']) | frame[column].isna())
+        if kind == 'float':
+            series = pd.to_numeric(series, errors='coerce')
+        elif kind == 'int':
+            series = pd.to_numeric(series, errors='coerce').round()
+        elif kind == 'bool':
+            series = series.map(_coerce_bool, na_action='ignore')
+        elif kind in ['string', 'category']:
+            series = series.map(str, na_action='ignore')
+        typed[column] = series.astype(PANDAS_DTYPES[kind])
+    return pd.DataFrame(typed, columns=frame.columns)
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    arrow_types = {
+        'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+    }
+    return pa.schema([pa.field(column, arrow_types[column_type(column)]) for column in columns])
+
+
+def write_artifact(frame, path):
+    """
+    Writes the typed catalog as an uncompressed Arrow IPC file, which readers can
+    memory-map without copying.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, schema=arrow_schema(frame.columns), preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return table
+
+
+def read_artifact(path):
+    """
+    Memory-maps an Arrow catalog artifact and returns it as a DataFrame backed by
+    the mapped Arrow buffers (no copy of the column data).
+    """
+    import pyarrow as pa
+
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_mapped_catalog(path):
+    """
+    Reads the mapped catalog from the typed artifact (.arrow) or the mapped CSV.
+    """
+    if path.lower().endswith('.arrow'):
+        return read_artifact(path)
+    return apply_schema(pd.read_csv(path, dtype=str, keep_default_na=False))
+
+
+def render_vendure_csv(frame, path):
+    """
+    Renders the typed catalog to the CSV layout expected by Vendure's importer.
+    Missing values become empty cells and flags are written as 'True'/'False'.
+    """
+    frame.to_csv(path, index=False, na_rep='')
@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+from source_cache import cache_dir, content_hash, load_source
+
+
+def normalize_facet_part(text):
+    """
+    Collapses internal whitespace and strips the ends of a facet name or value.
+    E.g., "  Camber   profile " -> "Camber profile"
+    """
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+
+def facet_key(text):
+    """
+    Returns the case-insensitive lookup key for a normalized facet name or value,
+    so that "Rider level:Expert" and "rider level: expert" resolve to the same facet.
+    """
+    return text.casefold()
+
+
+def split_facets(raw_facets, skipped=None):
+    """
+    Splits a pipe-separated facet string into normalized (name, value) pairs.
+    Parts without a name are left out and, if `skipped` is a list, collected in it.
+    """
+    pairs = []
+    for part in str(raw_facets).split('|'):
+        if ':' not in part:
+            if part.strip() and skipped is not None:
+                skipped.append(part.strip())
+            continue
+        name, value = part.split(':', 1)
+        name, value = normalize_facet_part(name), normalize_facet_part(value)
+        if name and value:
+            pairs.append((name, value))
+    return pairs
+
+
+def most_frequent_spelling(spellings):
+    """
+    Returns the spelling with the highest count; ties go to the lowest string, so the
+    choice never depends on row order.
+    """
+    return min(spellings.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+class FacetIndex:
+    """
+    Catalog-wide dictionary of facet names and values.
+
+    Every distinct raw facet string (e.g. the 'Facets' column of a row) is parsed once.
+    Facet names and values are interned with integer IDs and rendered with one
+    canonical spelling, which keeps spelling variants from creating separate facets
+    in Vendure. canonicalize() picks the most frequent spelling across the whole
+    catalog; the dictionary is saved (see catalog_facet_index) so IDs stay stable
+    across runs and partial runs render the same spellings as full runs.
+    """
+
+    def __init__(self, dictionary=None):
+        self.names = []          # facet_id -> display name
+        self.values = []         # value_id -> (facet_id, display value)
+        self.counts = []         # value_id -> number of rows carrying the value
+        self._name_ids = {}      # facet key -> facet_id
+        self._value_ids = {}     # (facet_id, value key) -> value_id
+        self._parsed = {}        # raw string -> tuple of value_ids
+        self._rendered = {}      # tuple of value_ids -> rendered 'name:value|...' string
+        if dictionary:
+            for name in dictionary['facets']:
+                self.intern_name(name)
+            for facet_id, value in dictionary['values']:
+                self.intern_value(facet_id, value)
+
+    def intern_name(self, name):
+        name = normalize_facet_part(name)
+        key = facet_key(name)
+        facet_id = self._name_ids.get(key)
+        if facet_id is None:
+            facet_id = len(self.names)
+            self._name_ids[key] = facet_id
+            self.names.append(sys.intern(name))
+        return facet_id
+
+    def intern_value(self, facet_id, value):
+        value = normalize_facet_part(value)
+        key = (facet_id, facet_key(value))
+        value_id = self._value_ids.get(key)
+        if value_id is None:
+            value_id = len(self.values)
+            self._value_ids[key] = value_id
+            self.values.append((facet_id, sys.intern(value)))
+            self.counts.append(0)
+        return value_id
+
+    def parse(self, raw_facets):
+        """
+        Parses a pipe-separated facet string into a tuple of value IDs.
+
+        Args:
+            raw_facets (Any): E.g. "Brand:Dupraz | Rider level: Expert". NaN or empty yields ().
+
+        Returns:
+            tuple: Value IDs in source order, without duplicates.
+        """
+        if pd.isna(raw_facets):
+            return ()
+        raw_facets = str(raw_facets)
+        value_ids = self._parsed.get(raw_facets)
+        if value_ids is not None:
+            return value_ids
+
+        seen = []
+        skipped = []
+        for name, value in split_facets(raw_facets, skipped):
+            value_id = self.intern_value(self.intern_name(name), value)
+            if value_id not in seen:
+                seen.append(value_id)
+
+        for part in skipped:
+            print(f"Skipping facet without a name: '{part}'")
+
+        value_ids = tuple(seen)
+        self._parsed[raw_facets] = value_ids
+        return value_ids
+
+    def canonicalize(self, raw_values):
+        """
+        Sets the display spelling of every facet name and value to its most frequent
+        spelling in `raw_values`. Names and values not yet in the dictionary get IDs
+        after the existing ones, in key order rather than row order.
+
+        Args:
+            raw_values (Iterable): Raw facet strings of the whole catalog, one per row.
+        """
+        name_spellings = {}      # facet key -> {spelling: rows}
+        value_spellings = {}     # (facet key, value key) -> {spelling: rows}
+        for raw_facets, rows in pd.Series(raw_values, dtype=object).dropna().value_counts().items():
+            for name, value in split_facets(raw_facets):
+                name_key, value_key = facet_key(name), facet_key(value)
+                spellings = name_spellings.setdefault(name_key, {})
+                spellings[name] = spellings.get(name, 0) + rows
+                spellings = value_spellings.setdefault((name_key, value_key), {})
+                spellings[value] = spellings.get(value, 0) + rows
+
+        for name_key in sorted(name_spellings):
+            facet_id = self.intern_name(most_frequent_spelling(name_spellings[name_key]))
+            self.names[facet_id] = sys.intern(most_frequent_spelling(name_spellings[name_key]))
+        for name_key, value_key in sorted(value_spellings):
+            facet_id = self._name_ids[name_key]
+            spelling = most_frequent_spelling(value_spellings[(name_key, value_key)])
+            value_id = self.intern_value(facet_id, spelling)
+            self.values[value_id] = (facet_id, sys.intern(spelling))
+
+        self._parsed = {}
+        self._rendered = {}
+
+    def dictionary(self):
+        """
+        Returns the names and values in ID order, as accepted by FacetIndex(dictionary).
+        """
+        return {
+            'facets': list(self.names),
+            'values': [[facet_id, value] for facet_id, value in self.values],
+        }
+
+    def render(self, value_ids):
+        """
+        Renders value IDs back to Vendure's "name:value|name:value" format.
+        Equal ID tuples share a single interned string.
+        """
+        rendered = self._rendered.get(value_ids)
+        if rendered is None:
+            rendered = sys.intern('|'.join(
+                f"{self.names[self.values[value_id][0]]}:{self.values[value_id][1]}"
+                for value_id in value_ids
+            ))
+            self._rendered[value_ids] = rendered
+        return rendered
+
+    def add(self, raw_facets):
+        """
+        Parses, counts and renders the facets of one output row.
+        """
+        value_ids = self.parse(raw_facets)
+        for value_id in value_ids:
+            self.counts[value_id] += 1
+        return self.render(value_ids)
+
+    def summary(self):
+        """
+        Returns a DataFrame with one row per facet value in use and the number of rows carrying it.
+        """
+        return pd.DataFrame(
+            [
+                {
+                    'facetId': facet_id,
+                    'facet': self.names[facet_id],
+                    'valueId': value_id,
+                    'value': value,
+                    'count': self.counts[value_id],
+                }
+                for value_id, (facet_id, value) in enumerate(self.values)
+                if self.counts[value_id]
+            ],
+            columns=['facetId', 'facet', 'valueId', 'value', 'count'],
+        )
+
+
+def facet_dictionary_path(source_file):
+    """
+    Returns the path of the saved facet dictionary of a workbook.
+    """
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(cache_dir(source_file), f'{stem}.facets.json')
+
+
+def catalog_facet_strings(source_data):
+    """
+    Returns the raw facet strings the mapping renders: 'Facets' of the first row of
+    every product and 'variantFacets' of every variant.
+    """
+    rows = source_data[source_data['slug'].notna()]
+    parts = []
+    if 'Facets' in rows.columns:
+        parts.append(rows.drop_duplicates('slug')['Facets'])
+    if 'variantFacets' in rows.columns:
+        parts.append(rows['variantFacets'])
+    return pd.concat(parts, ignore_index=True) if parts else pd.Series(dtype=object)
+
+
+def catalog_facet_index(source_file, source_data=None):
+    """
+    Returns the facet index of the whole workbook, with canonical spellings and the
+    IDs of the saved dictionary.
+
+    Args:
+        source_file (str): Path of the workbook, which determines the dictionary location.
+        source_data (pd.DataFrame): All source rows, or None for a partial run. A partial
+            run reuses the saved dictionary if it was built from the same workbook
+            content, and otherwise reads the whole workbook through the row cache.
+
+    Returns:
+        FacetIndex: The index, with all counts at zero.
+    """
+    path = facet_dictionary_path(source_file)
+    digest = content_hash(source_file)
+    try:
+        with open(path, encoding='utf-8') as handle:
+            saved = json.load(handle)
+    except (OSError, ValueError):
+        saved = None
+
+    if source_data is None:
+        if saved is not None and saved.get('hash') == digest:
+            return FacetIndex(saved)
+        source_data = load_source(source_file)
+
+    facet_index = FacetIndex(saved)
+    facet_index.canonicalize(catalog_facet_strings(source_data))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump({'hash': digest, **facet_index.dictionary()}, handle, ensure_ascii=False)
+    except OSError as e:
+        print(f"Warning: Could not save the facet dictionary: {e}")
+    return facet_index
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+def factorize_column(series):
+    """
+    Splits a column into codes and unique values.
+
+    Object columns are factorized on (type, value) so that e.g. 1, 1.0 and True
+    stay distinct, like they would when converted cell by cell. Missing values get
+    the code -1.
+
+    Returns:
+        tuple: (np.ndarray of codes, list of unique values as Python scalars)
+    """
+    if series.dtype != object:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        return codes, np.asarray(uniques).astype(object).tolist()
+
+    missing = series.isna().to_numpy()
+    codes = np.full(len(series), -1, dtype=np.intp)
+    lookup = {}
+    uniques = []
+    for position, value in enumerate(series.to_numpy()):
+        if missing[position]:
+            continue
+        key = (type(value), value)
+        code = lookup.get(key)
+        if code is None:
+            code = len(uniques)
+            lookup[key] = code
+            uniques.append(value)
+        codes[position] = code
+    return codes, uniques
+
+
+class FactorizedEvaluator:
+    """
+    Evaluates per-cell conversions once per distinct value of a source column and
+    broadcasts the results back to every row through the factorization codes.
+
+    Results and factorizations are cached, so the same conversion of the same
+    column is only ever computed once. `stats` records the uniqueness ratio of
+    every evaluated column.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.stats = []
+        self._factorized = {}
+        self._results = {}
+
+    def apply(self, column, func, name=None, default=None):
+        """
+        Applies `func` to every cell of `column`.
+
+        Args:
+            column (str): Source column name.
+            func (callable): Conversion taking a single cell value.
+            name (str): Name of the conversion, used as cache key and in the report.
+            default (Any): Cell value used when the column does not exist.
+
+        Returns:
+            np.ndarray: Object array with one converted value per row (positional).
+        """
+        name = name or getattr(func, '__name__', 'conversion')
+        cache_key = (column, name)
+        if cache_key in self._results:
+            return self._results[cache_key]
+
+        rows = len(self.frame)
+        if column not in self.frame.columns:
+            result = np.empty(rows, dtype=object)
+            result[:] = [func(default)] * rows
+            self._results[cache_key] = result
+            return result
+
+        if column not in self._factorized:
+            self._factorized[column] = factorize_column(self.frame[column])
+        codes, uniques = self._factorized[column]
+
+        # The missing-value result sits at the end, where code -1 points to
+        converted = np.empty(len(uniques) + 1, dtype=object)
+        converted[:len(uniques)] = [func(value) for value in uniques]
+        converted[-1] = func(float('nan'))
+        result = converted[codes]
+
+        self._results[cache_key] = result
+        self.stats.append({
+            'column': column,
+            'conversion': name,
+            'rows': rows,
+            'uniques': len(uniques),
+            'uniquenessRatio': len(uniques) / rows if rows else 0.0,
+        })
+        return result
+
+    def report(self):
+        """
+        Returns the per-column uniqueness ratios, lowest (most shared work) first.
+        """
+        columns = ['column', 'conversion', 'rows', 'uniques', 'uniquenessRatio']
+        return pd.DataFrame(self.stats, columns=columns).sort_values('uniquenessRatio', kind='stable')
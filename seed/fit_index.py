@@ -0,0 +1,725 @@
+import argparse
+import mmap
+import struct
+import sys
+import time
+
+import numpy as np
+
+from catalog_artifact import read_mapped_catalog
+
+MAGIC = b'FITIDX03'
+# magic, variant count, cell count, max half width, boot margin, then per range
+# dimension (length, weight) the sizes of its open and lone segments (see SORTED_DIMENSIONS)
+HEADER = struct.Struct('<8sQQddQQQQ')
+
+# Variants are bucketed by the centre of their rider length and weight ranges,
+# rounded to whole cm / kg. Ranges that are missing or unusable go to the OPEN bucket.
+OPEN = -1
+CELL_STRIDE = 1 << 16
+
+# Stored per-variant float32 fields, in file order. Missing lower bounds are
+# stored as -inf and missing upper bounds as +inf, so they never exclude a rider.
+FIELDS = [
+    ('length_min', 'variant:riderLengthMin', -np.inf),
+    ('length_max', 'variant:riderLengthMax', np.inf),
+    ('weight_min', 'variant:riderWeightMin', -np.inf),
+    ('weight_max', 'variant:riderWeightMax', np.inf),
+    ('boot_max', 'variant:bootLengthMax', np.inf),
+    ('stance_min', 'variant:stanceMin', np.nan),
+    ('stance_max', 'variant:stanceMax', np.nan),
+    ('waist_width', 'variant:waistWidth', np.nan),
+]
+
+# Per-dimension sorted orders: permutations of the variants with a float32 sort key.
+# A range dimension's order has three segments: variants without a usable range in
+# it (open), sorted by boot length maximum; variants with a usable range in it but
+# not in the other range dimension (lone), sorted by range centre; and variants with
+# usable ranges in both (both), sorted by range centre. The boot order holds every
+# variant, sorted by boot length maximum.
+SORTED_DIMENSIONS = ['length', 'weight', 'boot']
+
+# Flag bits for variants whose ranges cannot be used for fitting
+FLAG_LENGTH_EMPTY = 1
+FLAG_LENGTH_INVERTED = 2
+FLAG_WEIGHT_EMPTY = 4
+FLAG_WEIGHT_INVERTED = 8
+FLAG_WEIGHT_COPIED = 16
+FLAG_STANCE_INVERTED = 32
+
+# Flags that a data-quality rule (see quality_rules.QUALITY_RULES) already reports on every mapping run
+QUALITY_RULE_FLAGS = FLAG_LENGTH_INVERTED | FLAG_WEIGHT_COPIED | FLAG_STANCE_INVERTED
+
+FLAG_NAMES = {
+    FLAG_LENGTH_EMPTY: 'rider length range is empty',
+    FLAG_LENGTH_INVERTED: 'rider length range is inverted',
+    FLAG_WEIGHT_EMPTY: 'rider weight range is empty',
+    FLAG_WEIGHT_INVERTED: 'rider weight range is inverted',
+    FLAG_WEIGHT_COPIED: 'rider weight range equals the rider length range',
+    FLAG_STANCE_INVERTED: 'stance range is inverted',
+}
+
+# Rider boots are expected to stay within this margin (cm) below the board's boot length maximum
+BOOT_MARGIN = 3.0
+
+# Scores are float32, so a score bound only prunes when it is beaten by more than this
+SCORE_TOLERANCE = 1e-5
+
+# Outer radius (cells) of the first band of rings; later bands double at most, see FitIndex._bands
+FIRST_BAND = 2
+
+# Half width (cm / kg) of the first window over sorted range centres; later windows double
+# at most, see FitIndex._windows
+FIRST_WINDOW = 0.25
+
+
+def range_flags(length_min, length_max, weight_min, weight_max, stance_min, stance_max):
+    """
+    Flags empty (min == max) and inverted (min > max) ranges, and weight ranges
+    that are a copy of the rider length values, all as arrays of flag bits. A copied
+    weight range is only flagged as copied, even when the copy is empty.
+    Comparisons with missing values are False, so missing ranges are never flagged.
+    """
+    flags = np.zeros(len(length_min), dtype=np.uint8)
+    copied = (((weight_min == length_max) & (weight_max == length_max))
+              | ((weight_min == length_min) & (weight_max == length_max)))
+    flags[length_min == length_max] |= FLAG_LENGTH_EMPTY
+    flags[length_min > length_max] |= FLAG_LENGTH_INVERTED
+    flags[(weight_min == weight_max) & ~copied] |= FLAG_WEIGHT_EMPTY
+    flags[(weight_min > weight_max) & ~copied] |= FLAG_WEIGHT_INVERTED
+    flags[copied] |= FLAG_WEIGHT_COPIED
+    flags[stance_min > stance_max] |= FLAG_STANCE_INVERTED
+    return flags
+
+
+def _open_flagged(lower, upper, unusable):
+    """
+    Opens up ranges that cannot be used for fitting, so they do not exclude riders.
+    """
+    lower = lower.copy()
+    upper = upper.copy()
+    lower[unusable] = -np.inf
+    upper[unusable] = np.inf
+    return lower, upper
+
+
+def _sorted_dimension(lower, upper, other_bounded, boot_max):
+    """
+    Returns the order, sort keys and segment sizes of one range dimension, see SORTED_DIMENSIONS.
+    """
+    bounded = np.isfinite(lower) & np.isfinite(upper)
+    with np.errstate(invalid='ignore'):
+        centres = ((lower + upper) / 2).astype(np.float32)
+    open_positions = np.flatnonzero(~bounded)
+    open_positions = open_positions[np.argsort(boot_max[open_positions], kind='stable')]
+    segments = [open_positions]
+    for segment in (bounded & ~other_bounded, bounded & other_bounded):
+        positions = np.flatnonzero(segment)
+        segments.append(positions[np.argsort(centres[positions], kind='stable')])
+    order = np.concatenate(segments)
+    keys = np.concatenate((boot_max[segments[0]], centres[segments[1]], centres[segments[2]]))
+    return order.astype(np.int32), keys.astype(np.float32), len(segments[0]), len(segments[1])
+
+
+def _boot_bits(boot_max):
+    """
+    Returns boot length maxima as integers that sort like the values: the bit
+    patterns of non-negative float32 values do, with +inf last. Negative values
+    cannot be real boot lengths and sort as 0.
+    """
+    return np.where(boot_max > 0, boot_max, 0).astype(np.float32).view(np.uint32).astype(np.uint64)
+
+
+def _concatenate_ranges(starts, ends):
+    """
+    Returns the positions start:end of every (start, end) pair as one array.
+    """
+    lengths = ends - starts
+    nonempty = lengths > 0
+    starts, lengths = starts[nonempty], lengths[nonempty]
+    if not len(lengths):
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(offsets[-1] + lengths[-1])
+
+
+def build_fit_index(skus, columns, path):
+    """
+    Builds the fit index and writes it to `path`.
+
+    Args:
+        skus (list): SKU per variant.
+        columns (dict): Mapped column name (see FIELDS) -> float array per variant.
+        path (str): Output file.
+
+    Returns:
+        np.ndarray: Flag bits per variant, in input order.
+    """
+    values = {}
+    for name, source, missing in FIELDS:
+        array = np.asarray(columns.get(source, np.full(len(skus), np.nan)), dtype=np.float64)
+        values[name] = array
+
+    flags = range_flags(values['length_min'], values['length_max'], values['weight_min'],
+                        values['weight_max'], values['stance_min'], values['stance_max'])
+
+    values['length_min'], values['length_max'] = _open_flagged(
+        values['length_min'], values['length_max'], (flags & (FLAG_LENGTH_EMPTY | FLAG_LENGTH_INVERTED)) > 0)
+    values['weight_min'], values['weight_max'] = _open_flagged(
+        values['weight_min'], values['weight_max'],
+        (flags & (FLAG_WEIGHT_EMPTY | FLAG_WEIGHT_INVERTED | FLAG_WEIGHT_COPIED)) > 0)
+    for name, _, missing in FIELDS:
+        values[name] = np.where(np.isnan(values[name]), missing, values[name]).astype(np.float32)
+
+    # Bucket every variant by the rounded centres of its length and weight ranges
+    def centre_cell(lower, upper):
+        bounded = np.isfinite(lower) & np.isfinite(upper)
+        with np.errstate(invalid='ignore'):
+            centre = np.rint((lower + upper) / 2)
+        return np.where(bounded, centre, OPEN).astype(np.int64), bounded
+
+    length_cell, length_bounded = centre_cell(values['length_min'], values['length_max'])
+    weight_cell, weight_bounded = centre_cell(values['weight_min'], values['weight_max'])
+    cell_of_variant = (length_cell - OPEN) * CELL_STRIDE + (weight_cell - OPEN)
+    # Within a cell, variants are ordered by boot length maximum
+    order = np.lexsort((values['boot_max'], cell_of_variant))
+    for name in values:
+        values[name] = values[name][order]
+    length_bounded, weight_bounded = length_bounded[order], weight_bounded[order]
+    cell_keys, cell_counts = np.unique(cell_of_variant[order], return_counts=True)
+    cell_starts = np.zeros(len(cell_keys) + 1, dtype=np.int64)
+    np.cumsum(cell_counts, out=cell_starts[1:])
+    # Cell and boot length maximum of every variant as one sorted key, see FitIndex._cell_boot_key
+    cells_by_variant = np.repeat(np.arange(len(cell_keys), dtype=np.uint64), cell_counts)
+    cell_boot_keys = (cells_by_variant << np.uint64(32)) | _boot_bits(values['boot_max'])
+
+    half_widths = np.concatenate((
+        (values['length_max'] - values['length_min'])[length_bounded] / 2,
+        (values['weight_max'] - values['weight_min'])[weight_bounded] / 2,
+    ))
+    max_half_width = float(half_widths.max()) if len(half_widths) else 0.0
+
+    sorted_dimensions = {
+        'length': _sorted_dimension(values['length_min'], values['length_max'], weight_bounded, values['boot_max']),
+        'weight': _sorted_dimension(values['weight_min'], values['weight_max'], length_bounded, values['boot_max']),
+    }
+    by_boot = np.argsort(values['boot_max'], kind='stable')
+    sorted_dimensions['boot'] = (by_boot.astype(np.int32), values['boot_max'][by_boot])
+
+    sku_bytes = [str(skus[i]).encode('utf-8') for i in order]
+    sku_offsets = np.zeros(len(sku_bytes) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in sku_bytes], out=sku_offsets[1:])
+
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(order), len(cell_keys), max_half_width, BOOT_MARGIN,
+                                 *sorted_dimensions['length'][2:], *sorted_dimensions['weight'][2:]))
+        handle.write(cell_keys.astype(np.int64).tobytes())
+        handle.write(cell_starts.tobytes())
+        handle.write(cell_boot_keys.tobytes())
+        for name, _, _ in FIELDS:
+            handle.write(values[name].tobytes())
+        for dimension in SORTED_DIMENSIONS:
+            dimension_order, keys = sorted_dimensions[dimension][:2]
+            handle.write(dimension_order.tobytes())
+            handle.write(keys.tobytes())
+        handle.write(flags[order].tobytes())
+        handle.write(b'\0' * (-handle.tell() % 8))
+        handle.write(sku_offsets.tobytes())
+        handle.write(b''.join(sku_bytes))
+    return flags
+
+
+def build_fit_index_from_catalog(frame, path):
+    """
+    Builds the fit index from the typed mapped catalog and reports flagged variants.
+    """
+    columns = {
+        source: frame[source].to_numpy(dtype=np.float64, na_value=np.nan)
+        for _, source, _ in FIELDS if source in frame.columns
+    }
+    skus = frame['sku'].to_numpy(dtype=object, na_value='').tolist()
+    flags = build_fit_index(skus, columns, path)
+    report_flags(skus, flags)
+    return flags
+
+
+def report_flags(skus, flags, samples=3):
+    """
+    Prints the variants whose ranges the index had to open up, except those that a
+    data-quality rule reports already.
+    """
+    for bit, description in FLAG_NAMES.items():
+        if bit & QUALITY_RULE_FLAGS:
+            continue
+        flagged = np.flatnonzero(flags & bit)
+        if len(flagged):
+            example = ', '.join(str(skus[i]) for i in flagged[:samples])
+            print(f"Fit index: {len(flagged)} variants where {description} (e.g. {example})")
+
+
+class FitIndex:
+    """
+    Read-only, memory-mapped rider fit index.
+
+    Variants with usable length and weight ranges are stored in cells keyed by the
+    rounded centres of both ranges, and a query with height and weight visits those
+    cells in widening bands of rings around the rider, nearest first. Variants with a
+    usable range in only one of the two are visited cell by cell along their row or
+    column. Within a cell, variants are sorted by boot length maximum, so once the
+    top results are good enough only the boot lengths that can still beat them are
+    read. A query that sets only one of height and weight widens a window over the
+    sorted range centres of that dimension instead, and variants without any range
+    the query can use are walked by boot length maximum. Every source stops as soon
+    as none of its unvisited variants can beat the current top results.
+
+    Usage:
+        index = FitIndex('fit.idx')
+        index.query(height=182, weight=78, boot_length=29.5)
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a fit index (or was built by an older version)")
+        (_, count, cells, self.max_half_width, self.boot_margin,
+         *segment_sizes) = HEADER.unpack_from(self._mmap, 0)
+        self.count = count
+
+        offset = HEADER.size
+        self.cell_keys = np.frombuffer(self._mmap, dtype=np.int64, count=cells, offset=offset)
+        offset += 8 * cells
+        self.cell_starts = np.frombuffer(self._mmap, dtype=np.int64, count=cells + 1, offset=offset)
+        offset += 8 * (cells + 1)
+        self._cell_boot_keys = np.frombuffer(self._mmap, dtype=np.uint64, count=count, offset=offset)
+        offset += 8 * count
+        for name, _, _ in FIELDS:
+            setattr(self, name, np.frombuffer(self._mmap, dtype=np.float32, count=count, offset=offset))
+            offset += 4 * count
+        # dimension -> (order, keys, segment boundaries)
+        self._sorted = {}
+        for dimension, (open_count, lone_count) in zip(
+                SORTED_DIMENSIONS, [segment_sizes[:2], segment_sizes[2:], (count, 0)]):
+            order = np.frombuffer(self._mmap, dtype=np.int32, count=count, offset=offset)
+            keys = np.frombuffer(self._mmap, dtype=np.float32, count=count, offset=offset + 4 * count)
+            self._sorted[dimension] = (order, keys, (0, open_count, open_count + lone_count, count))
+            offset += 8 * count
+        self.flags = np.frombuffer(self._mmap, dtype=np.uint8, count=count, offset=offset)
+        offset += count
+        offset += -offset % 8
+        self._sku_offsets = np.frombuffer(self._mmap, dtype=np.int64, count=count + 1, offset=offset)
+        self._sku_base = offset + 8 * (count + 1)
+
+        length_cells = self.cell_keys // CELL_STRIDE + OPEN
+        weight_cells = self.cell_keys % CELL_STRIDE + OPEN
+        bounded_length = length_cells[length_cells != OPEN]
+        bounded_weight = weight_cells[weight_cells != OPEN]
+        self._length_extent = (int(bounded_length.min()), int(bounded_length.max())) if len(bounded_length) else (0, 0)
+        self._weight_extent = (int(bounded_weight.min()), int(bounded_weight.max())) if len(bounded_weight) else (0, 0)
+
+    def sku(self, position):
+        start, end = self._sku_offsets[position], self._sku_offsets[position + 1]
+        return self._mmap[self._sku_base + start:self._sku_base + end].decode('utf-8')
+
+    def _cell_key(self, length_cell, weight_cell):
+        return (length_cell - OPEN) * CELL_STRIDE + (weight_cell - OPEN)
+
+    def _cell_boot_key(self, cells, boot_length):
+        bits = np.float32(boot_length if boot_length > 0 else 0).view(np.uint32)
+        return (cells.astype(np.uint64) << np.uint64(32)) | np.uint64(bits)
+
+    def _cell_positions(self, low, high, boot_window=None):
+        """
+        Returns the variant positions in the cells from `low` to `high` (arrays of keys).
+        With a boot window (see _boot_window), only the variants of each cell whose
+        boot length maximum lies within it are returned.
+        """
+        first = np.searchsorted(self.cell_keys, low, side='left')
+        last = np.searchsorted(self.cell_keys, high, side='right')
+        if boot_window is None:
+            return _concatenate_ranges(self.cell_starts[first], self.cell_starts[last])
+
+        # Within a cell, variants are sorted by boot length maximum
+        cells = _concatenate_ranges(first, last)
+        lowest, highest = boot_window
+        starts = np.searchsorted(self._cell_boot_keys, self._cell_boot_key(cells, lowest), side='left')
+        if not np.isfinite(highest):
+            return _concatenate_ranges(starts, self.cell_starts[cells + 1])
+        ends = np.searchsorted(self._cell_boot_keys, self._cell_boot_key(cells, highest), side='right')
+        return _concatenate_ranges(starts, ends)
+
+    def _boot_window(self, boot_length, kth_score, ranges, dimensions):
+        """
+        Returns the (lowest, highest) boot length maximum with which a variant that
+        declares `ranges` of the range dimensions of a query over `dimensions`
+        dimensions can still fit and beat `kth_score`, or None when the query has
+        no boot length.
+        """
+        if boot_length is None:
+            return None
+        # Even with every range dead centre, the boot score must exceed dimensions * kth - ranges
+        shortfall = ranges + 1 - dimensions * (kth_score - SCORE_TOLERANCE)
+        if shortfall >= 1:
+            # Boot scores never drop below 0, so any boot length maximum will do
+            return boot_length, np.inf
+        return boot_length, boot_length + self.boot_margin * shortfall
+
+    def _rings(self, length_cell, weight_cell, inner, outer, boot_window):
+        """
+        Returns the variant positions in the cells at Chebyshev distance `inner` to
+        `outer` from the rider's cell. Cells are sorted by length then weight, so every
+        run of cells within one length row is one contiguous slice of variants.
+        """
+        # Centres are never negative, so cells below 0 are skipped rather than mistaken for OPEN
+        rows = np.arange(max(length_cell - outer, 0), length_cell + outer + 1)
+        whole = np.abs(rows - length_cell) >= inner
+        # Rows outside the inner square are one run of cells, rows crossing it two
+        low = [self._cell_key(rows[whole], max(weight_cell - outer, 0)),
+               self._cell_key(rows[~whole], weight_cell + inner)]
+        high = [self._cell_key(rows[whole], weight_cell + outer), self._cell_key(rows[~whole], weight_cell + outer)]
+        if weight_cell - inner >= 0:
+            low.append(self._cell_key(rows[~whole], max(weight_cell - outer, 0)))
+            high.append(self._cell_key(rows[~whole], weight_cell - inner))
+        return self._cell_positions(np.concatenate(low), np.concatenate(high), boot_window)
+
+    def _bands(self, height, weight, boot_length, best_boot):
+        """
+        Yields the variants with usable length and weight ranges in widening bands of
+        rings around the rider, each time with a bound on the score of the variants
+        not yet yielded. Receives the current limit-th best score (see query).
+        """
+        length_cell = min(max(int(round(height)), 0), CELL_STRIDE // 2)
+        weight_cell = min(max(int(round(weight)), 0), CELL_STRIDE // 2)
+        # How far the rider is off the centre of its cell; clamped cells are only further away
+        offset = min(max(abs(height - length_cell), abs(weight - weight_cell)), 0.5)
+        last_radius = min(
+            max(abs(length_cell - self._length_extent[0]), abs(length_cell - self._length_extent[1]),
+                abs(weight_cell - self._weight_extent[0]), abs(weight_cell - self._weight_extent[1])),
+            # Beyond the widest range nothing more can fit
+            int(self.max_half_width) + 1,
+        )
+        dimensions = 2 if boot_length is None else 3
+        inner, outer = 0, min(FIRST_BAND, last_radius)
+        kth_score = yield
+        while inner <= last_radius:
+            # A variant in a later ring is this far from the rider in one of its ranges
+            bound = self._score_bound(outer + 0.5 - offset, 2, dimensions, best_boot)
+            boot_window = self._boot_window(boot_length, kth_score, 2, dimensions)
+            kth_score = yield self._rings(length_cell, weight_cell, inner, outer, boot_window), bound
+            # Double the band, but no further than the ring that settles the current top results
+            needed = self._settling_distance(kth_score, 2, dimensions, best_boot) + offset - 0.5
+            inner, outer = outer + 1, min(2 * outer + 1, max(int(np.ceil(min(needed, last_radius))), outer + 1),
+                                          last_radius)
+
+    def _line(self, dimension, value, boot_length, best_boot):
+        """
+        Yields the variants with a usable range in `dimension` but not in the other
+        range dimension, cell by cell around the rider, like _bands. Those are the OPEN
+        cells of one length row or one weight column, so every cell is one contiguous
+        slice of variants.
+        """
+        extent = self._length_extent if dimension == 'length' else self._weight_extent
+        cell = min(max(int(round(value)), 0), CELL_STRIDE // 2)
+        offset = min(abs(value - cell), 0.5)
+        last_radius = min(max(abs(cell - extent[0]), abs(cell - extent[1])), int(self.max_half_width) + 1)
+        # Lines are only walked by queries with both height and weight
+        dimensions = 2 if boot_length is None else 3
+        kth_score = yield
+        for radius in range(last_radius + 1):
+            cells = np.array([cell] if radius == 0 else [c for c in (cell - radius, cell + radius) if c >= 0])
+            keys = self._cell_key(cells, OPEN) if dimension == 'length' else self._cell_key(OPEN, cells)
+            bound = self._score_bound(radius + 0.5 - offset, 1, dimensions, best_boot)
+            boot_window = self._boot_window(boot_length, kth_score, 1, dimensions)
+            kth_score = yield self._cell_positions(keys, keys, boot_window), bound
+
+    def _windows(self, dimension, segment, value, best_boot):
+        """
+        Yields the variants of a segment of a sorted dimension (see SORTED_DIMENSIONS)
+        in widening windows of range centres around `value`, like _bands.
+        """
+        order, keys, boundaries = self._sorted[dimension]
+        start, end = boundaries[segment], boundaries[segment + 1]
+        centres = keys[start:end]
+        # float32 search values, as mixed types would convert the whole key array
+        low = high = int(np.searchsorted(centres, np.float32(value), side='left'))
+        radius = FIRST_WINDOW
+        # Windows are only walked by queries with one of height and weight
+        dimensions = 1 if best_boot is None else 2
+        kth_score = yield
+        while low > 0 or high < len(centres):
+            new_low = int(np.searchsorted(centres, np.float32(value - radius), side='left'))
+            new_high = int(np.searchsorted(centres, np.float32(value + radius), side='right'))
+            candidates = np.concatenate((order[start + new_low:start + low], order[start + high:start + new_high]))
+            low, high = new_low, new_high
+            kth_score = yield candidates.astype(np.int64), self._score_bound(radius, 1, dimensions, best_boot)
+            if radius >= self.max_half_width:
+                # Unvisited centres are further away than the widest range, so they cannot fit
+                return
+            # Double the window, but no further than needed to settle the current top results
+            needed = self._settling_distance(kth_score, 1, dimensions, best_boot)
+            radius = min(2 * radius, max(needed, radius + FIRST_WINDOW))
+
+    def _best_by_boot(self, order, keys, start, end, height, weight, boot_length, limit):
+        """
+        Returns the best fitting variants among positions start:end of a sorted order
+        (None for file order), which must be sorted by boot length maximum and lack
+        usable ranges in the dimensions the query sets. Their score then only depends
+        on the boot length, so the best ones are the first `limit` that fit. Open-ended
+        ranges can still exclude a rider, hence the scan in chunks.
+        """
+        if boot_length is not None:
+            start += int(np.searchsorted(keys[start:end], np.float32(boot_length), side='left'))
+        found_positions, found_scores = [], []
+        found = 0
+        chunk = 4 * limit
+        while start < end and found < limit:
+            stop = min(end, start + chunk)
+            candidates = np.arange(start, stop) if order is None else order[start:stop].astype(np.int64)
+            positions, scores = self._score(candidates, height, weight, boot_length)
+            found_positions.append(positions[:limit - found])
+            found_scores.append(scores[:limit - found])
+            found += len(found_positions[-1])
+            start = stop
+        if not found_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(found_positions), np.concatenate(found_scores)
+
+    def _boot_score_bound(self, boot_length):
+        """
+        Returns the best boot score any fitting variant can reach: that of the smallest
+        boot length maximum at or above the rider's boot length.
+        """
+        _, keys, _ = self._sorted['boot']
+        position = np.searchsorted(keys, np.float32(boot_length), side='left')
+        if position == len(keys) or not np.isfinite(keys[position]):
+            return 0.0
+        return 1 - min(max((float(keys[position]) - boot_length) / self.boot_margin, 0), 1)
+
+    def _score_bound(self, distance, ranges, dimensions, best_boot):
+        """
+        Returns an upper bound on the score, in a query over `dimensions` dimensions,
+        of a variant that is at least `distance` away from the rider in one of its
+        `ranges` usable range dimensions, assuming every other declared range is dead centre.
+        """
+        far = 1 - distance / self.max_half_width if self.max_half_width > 0 else 0.0
+        return (ranges - 1 + far + (best_boot or 0)) / dimensions
+
+    def _settling_distance(self, kth_score, ranges, dimensions, best_boot):
+        """
+        Returns the distance beyond which _score_bound falls clearly below `kth_score`.
+        """
+        if kth_score == -np.inf:
+            return np.inf
+        score = kth_score - 2 * SCORE_TOLERANCE
+        return (ranges + (best_boot or 0) - dimensions * score) * self.max_half_width
+
+    def _score(self, candidates, height, weight, boot_length):
+        """
+        Returns the fitting candidates and their scores. The score is the mean, over
+        the dimensions the query sets, of how centred the rider is (1.0 is dead centre).
+        A range or boot length maximum the variant does not declare scores 0: the
+        variant is not known to fit there, so it ranks below variants whose declared
+        range fits the rider. The score bounds of the query sources rely on this.
+        """
+        ranges = [(value, lower[candidates], upper[candidates])
+                  for value, lower, upper in ((height, self.length_min, self.length_max),
+                                              (weight, self.weight_min, self.weight_max)) if value is not None]
+        fits = np.ones(len(candidates), dtype=bool)
+        for value, lower, upper in ranges:
+            fits &= (lower <= value) & (value <= upper)
+        if boot_length is not None:
+            boot_max = self.boot_max[candidates]
+            fits &= boot_length <= boot_max
+
+        # Only the fitting candidates are scored, so the rider is always within their ranges
+        matching = np.flatnonzero(fits)
+        score = np.zeros(len(matching), dtype=np.float32)
+        for value, lower, upper in ranges:
+            lower, upper = lower[matching], upper[matching]
+            span = upper - lower
+            score += np.divide(2 * np.minimum(value - lower, upper - value), span,
+                               out=np.zeros_like(span), where=span < np.inf)
+        if boot_length is not None:
+            boot_max = boot_max[matching]
+            # An unknown boot length maximum (+inf) scores 0, as does one a full margin above the boot
+            score += 1 - np.minimum((boot_max - boot_length) / self.boot_margin, 1)
+        dimensions = len(ranges) + (boot_length is not None)
+        return candidates[matching], score / max(dimensions, 1)
+
+    @staticmethod
+    def _kth_score(found_scores, limit):
+        """
+        Returns the limit-th best score found so far, or -inf while fewer were found.
+        """
+        found = sum(len(scores) for scores in found_scores)
+        if found < limit:
+            return -np.inf
+        return np.partition(np.concatenate(found_scores), found - limit)[found - limit]
+
+    def query(self, height=None, weight=None, boot_length=None, limit=20):
+        """
+        Finds the variants that fit a rider, best fit first.
+
+        Args:
+            height (float): Rider length in cm.
+            weight (float): Rider weight in kg.
+            boot_length (float): Boot length in cm.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list: (sku, score) tuples, see _score.
+        """
+        if limit <= 0:
+            return []
+        best_boot = None if boot_length is None else self._boot_score_bound(boot_length)
+        if height is not None and weight is not None:
+            unranged = self._cell_key(OPEN, OPEN)
+            start = int(self.cell_starts[np.searchsorted(self.cell_keys, unranged, side='left')])
+            end = int(self.cell_starts[np.searchsorted(self.cell_keys, unranged, side='right')])
+            positions, scores = self._best_by_boot(None, self.boot_max, start, end, height, weight, boot_length, limit)
+            sources = [self._bands(height, weight, boot_length, best_boot),
+                       self._line('length', height, boot_length, best_boot),
+                       self._line('weight', weight, boot_length, best_boot)]
+        elif height is not None or weight is not None:
+            dimension, value = ('length', height) if height is not None else ('weight', weight)
+            order, keys, boundaries = self._sorted[dimension]
+            positions, scores = self._best_by_boot(order, keys, 0, boundaries[1], height, weight, boot_length, limit)
+            sources = [self._windows(dimension, 1, value, best_boot),
+                       self._windows(dimension, 2, value, best_boot)]
+        else:
+            order, keys, _ = self._sorted['boot']
+            positions, scores = self._best_by_boot(order, keys, 0, self.count, height, weight, boot_length, limit)
+            sources = []
+
+        found_positions, found_scores = [positions], [scores]
+        kth_score = self._kth_score(found_scores, limit)
+        for source in sources:
+            next(source)
+        while sources:
+            # Advance every source one step, sending it the limit-th best score so far,
+            # then drop those that cannot beat the top results any more
+            steps = []
+            for source in sources:
+                try:
+                    steps.append((source, *source.send(kth_score)))
+                except StopIteration:
+                    pass
+            if not steps:
+                break
+            positions, scores = self._score(np.concatenate([candidates for _, candidates, _ in steps]),
+                                            height, weight, boot_length)
+            found_positions.append(positions)
+            found_scores.append(scores)
+            kth_score = self._kth_score(found_scores, limit)
+            sources = [source for source, _, bound in steps if kth_score <= bound + SCORE_TOLERANCE]
+        positions = np.concatenate(found_positions)
+        scores = np.concatenate(found_scores)
+
+        if len(positions) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(positions))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.sku(int(positions[i])), float(scores[i])) for i in top]
+
+
+def synthetic_columns(variants, seed=0, unranged=0.8):
+    """
+    Generates plausible board ranges for benchmarking: rider length spans of
+    20-35 cm between 140 and 200 cm, weight spans of 20-35 kg and boot maxima
+    of 26-34 cm. A fraction `unranged` of the variants declares no rider ranges
+    at all, as in master.xlsx (213 of 265 variants), and about 10% of the
+    remaining range bounds are missing.
+    """
+    rng = np.random.default_rng(seed)
+    length_min = rng.uniform(140, 185, variants).round()
+    weight_min = rng.uniform(40, 95, variants).round()
+    columns = {
+        'variant:riderLengthMin': length_min,
+        'variant:riderLengthMax': length_min + rng.uniform(20, 35, variants).round(),
+        'variant:riderWeightMin': weight_min,
+        'variant:riderWeightMax': weight_min + rng.uniform(20, 35, variants).round(),
+        'variant:bootLengthMax': rng.uniform(26, 34, variants).round(1),
+    }
+    without_ranges = rng.random(variants) < unranged
+    for source in ['variant:riderLengthMin', 'variant:riderLengthMax', 'variant:riderWeightMin',
+                   'variant:riderWeightMax']:
+        columns[source][without_ranges | (rng.random(variants) < 0.1)] = np.nan
+    skus = [f'SN-BRD-SYNTH-{i:07d}' for i in range(variants)]
+    return skus, columns
+
+
+def benchmark(path, variants, unranged, queries=1000, seed=0):
+    started = time.perf_counter()
+    skus, columns = synthetic_columns(variants, seed, unranged)
+    print(f"Generated {variants} variants in {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    build_fit_index(skus, columns, path)
+    print(f"Built index in {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    index = FitIndex(path)
+    print(f"Opened index in {(time.perf_counter() - started) * 1000:.3f} ms")
+
+    rng = np.random.default_rng(seed + 1)
+    riders = np.column_stack((rng.uniform(150, 200, queries), rng.uniform(45, 110, queries), rng.uniform(24, 33, queries)))
+    # Every query shape, from the full rider down to a boot length alone
+    for name, used in [('height, weight, boot', (1, 1, 1)), ('height, weight', (1, 1, 0)),
+                       ('height, boot', (1, 0, 1)), ('weight, boot', (0, 1, 1)),
+                       ('height', (1, 0, 0)), ('weight', (0, 1, 0)), ('boot', (0, 0, 1))]:
+        timings = []
+        for rider in riders:
+            values = [float(value) if use else None for value, use in zip(rider, used)]
+            started = time.perf_counter()
+            index.query(*values)
+            timings.append(time.perf_counter() - started)
+        timings = np.array(timings) * 1000
+        print(f"{queries} queries by {name}: mean {timings.mean():.3f} ms, p50 {np.percentile(timings, 50):.3f} ms, "
+              f"p99 {np.percentile(timings, 99):.3f} ms")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Build and query the rider fit index.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the index from the mapped catalog')
+    build_parser.add_argument('input_file', type=str, help='Mapped CSV or typed artifact (e.g., mapped.arrow)')
+    build_parser.add_argument('index_file', type=str, help='Fit index file (e.g., fit.idx)')
+
+    query_parser = subparsers.add_parser('query', help='Find the board sizes that fit a rider')
+    query_parser.add_argument('index_file', type=str, help='Fit index file')
+    query_parser.add_argument('--height', type=float, help='Rider length (cm)')
+    query_parser.add_argument('--weight', type=float, help='Rider weight (kg)')
+    query_parser.add_argument('--boot', type=float, help='Boot length (cm)')
+    query_parser.add_argument('--limit', type=int, default=20, help='Maximum number of results')
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark on synthetic variants')
+    bench_parser.add_argument('index_file', type=str, help='Where to write the benchmark index')
+    bench_parser.add_argument('--variants', type=int, default=1000000, help='Number of synthetic variants')
+    bench_parser.add_argument('--unranged', type=float, default=0.8,
+                              help='Fraction of variants without rider ranges')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    if args.command == 'build':
+        frame = read_mapped_catalog(args.input_file)
+        build_fit_index_from_catalog(frame, args.index_file)
+        print(f"Fit index saved to {args.index_file}")
+    elif args.command == 'query':
+        try:
+            index = FitIndex(args.index_file)
+        except (OSError, ValueError) as e:
+            print(f"Error opening fit index: {e}")
+            sys.exit(1)
+        for sku, score in index.query(args.height, args.weight, args.boot, args.limit):
+            print(f"{score:6.3f}  {sku}")
+    else:
+        benchmark(args.index_file, args.variants, args.unranged)
+
+
+if __name__ == '__main__':
+    main()
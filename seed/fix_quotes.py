@@ -1,11 +1,23 @@
+import argparse
+
 import pandas as pd
 
-# File paths
-file_path = './mapped.csv'
-output_path = './products_fixed.csv'
+from catalog_artifact import read_artifact, render_vendure_csv
+
+# File paths (the input can also be the typed artifact written by map_pim.py --artifact)
+parser = argparse.ArgumentParser(description='Fix quoting in the mapped Vendure CSV.')
+parser.add_argument('input_file', nargs='?', default='./mapped.csv', help='Mapped CSV or .arrow artifact')
+parser.add_argument('output_file', nargs='?', default='./products_fixed.csv', help='Path to the fixed CSV')
+args = parser.parse_args()
+file_path = args.input_file
+output_path = args.output_file
 
-# Load the CSV file
-products_csv = pd.read_csv(file_path)
+# Load the typed artifact (memory-mapped) or the CSV file
+from_artifact = file_path.lower().endswith('.arrow')
+if from_artifact:
+    products_csv = read_artifact(file_path)
+else:
+    products_csv = pd.read_csv(file_path)
 
 # Strip whitespace from column names
 products_csv.columns = products_csv.columns.str.strip()
@@ -83,7 +95,7 @@ for column in numeric_columns:
         products_csv[column] = products_csv[column].astype('float64')
 
 # Save the updated CSV file
-products_csv.to_csv(output_path, index=False)
+render_vendure_csv(products_csv, output_path)
 
 print(f"File saved to {output_path}")
 
@@ -3,6 +3,19 @@ import re
 import argparse
 import sys
 
+from catalog_artifact import apply_schema, read_artifact, render_vendure_csv, write_artifact
+from facet_index import catalog_facet_index
+from fit_index import build_fit_index_from_catalog
+from factorized_eval import FactorizedEvaluator
+from price_sync import (
+    DEFAULT_STOCK_ON_HAND, PRICE_STOCK_SOURCE_COLUMNS, commit_state, diff_price_stock, load_state,
+    pending_path, price_stock_state, save_state, state_path,
+)
+from quality_rules import ERROR, OK, run_quality_rules
+from search_index import build_search_index
+from source_cache import load_source, parse_only
+from xlsx_projection import read_columns
+
 def clean_html(raw_html):
     if pd.isna(raw_html):
         return ''
@@ -57,16 +70,24 @@ def parse_rating(value):
 def should_tab_be_visible(tab_bars):
     return any(bar['visible'] for bar in tab_bars)
 
-def parse_and_process_bars(row, bar_info, tab_id=None):
+def parse_and_process_bars(row, bar_info, tab_id=None, ratings=None):
+    """
+    Builds the bars of an option tab. `ratings` optionally maps each source key
+    to its already parsed rating (see FactorizedEvaluator); otherwise the rating
+    is parsed from the row.
+    """
     bars = []
     for i, (bar_name, source_key) in enumerate(bar_info, start=1):
-        # Fetch the raw value
-        raw_value = row.get(source_key, 'Missing Key')
-        print(f"Processing {bar_name}: Source Key='{source_key}', Raw Value='{raw_value}'")
+        if ratings is not None:
+            rating = ratings[source_key]
+        else:
+            # Fetch the raw value
+            raw_value = row.get(source_key, 'Missing Key')
+            print(f"Processing {bar_name}: Source Key='{source_key}', Raw Value='{raw_value}'")
 
-        # Parse the rating
-        rating = parse_rating(raw_value)
-        print(f"Parsed Rating for {bar_name}: {rating}")
+            # Parse the rating
+            rating = parse_rating(raw_value)
+            print(f"Parsed Rating for {bar_name}: {rating}")
 
         visible = not pd.isna(rating) and rating > 0
 
@@ -124,19 +145,12 @@ def combine_option_groups_and_values(row, option_group_columns, option_value_col
 
     return optionGroups_str, optionValues_str
 
-def process_facets(row):
+def process_facets(row, facet_index):
     """
-    Extract facets from the 'Facets' field and strip spaces around pipes.
-    E.g., "Facet1:Value1 | Facet2:Value2" -> "Facet1:Value1|Facet2:Value2"
+    Extract facets from the 'Facets' field through the catalog-wide facet index.
+    E.g., "Facet1:Value1 | facet1: value1 | Facet2:Value2" -> "Facet1:Value1|Facet2:Value2"
     """
-    facets = row.get('Facets', '')
-    if pd.isna(facets):
-        return ''
-    # Replace spaces around pipes
-    facets_clean = re.sub(r'\s*\|\s*', '|', str(facets).strip())
-    return facets_clean
-
-import pandas as pd
+    return facet_index.add(row.get('Facets', ''))
 
 import re
 import pandas as pd
@@ -155,7 +169,14 @@ def clean_and_convert(row, key, data_type):
     Returns:
     - The cleaned and converted value.
     """
-    value = row.get(key, None)
+    return convert_value(row.get(key, None), key, data_type)
+
+
+def convert_value(value, key, data_type):
+    """
+    Handles NaN and converts a single cell value to the specified data type.
+    See clean_and_convert for the parameters; `key` is only used for logging.
+    """
     if pd.isna(value):
         return ''
 
@@ -192,13 +213,110 @@ def clean_and_convert(row, key, data_type):
         return ''
 
 
-def convert_source_to_products(source_file, output_file):
+def stock_on_hand(value):
+    """
+    Returns the stock level from the source, or DEFAULT_STOCK_ON_HAND when it is empty.
+    """
+    stock = convert_value(value, 'stockOnHand', 'float')
+    return DEFAULT_STOCK_ON_HAND if stock == '' else int(stock)
+
+
+def map_prices_and_stock(source_data):
+    """
+    Maps only the price and stock fields of every variant, with the same conversions
+    as convert_source_to_products. Rows without slug are skipped there too.
+    """
+    source_data = source_data[source_data['slug'].notna()].reset_index(drop=True)
+    evaluator = FactorizedEvaluator(source_data)
+
+    def convert(key, data_type):
+        return evaluator.apply(key, lambda value: convert_value(value, key, data_type), name=data_type)
+
+    return apply_schema(pd.DataFrame({
+        'sku': convert('sku', 'string'),
+        'price': convert('price', 'float'),
+        'stockOnHand': evaluator.apply('stockOnHand', stock_on_hand, default=float('nan')),
+        'taxCategory': convert('taxCategory', 'string'),
+    }))
+
+
+def update_prices_and_stock(source_file, output_file):
+    """
+    Writes the variants whose price, stock or tax category changed since the state
+    last imported into Vendure to `output_file`, reading only those columns from the
+    workbook. The state of this run stays pending until --commit-state confirms that
+    `output_file` was imported, so until then every run still writes these changes.
+
+    Returns:
+        int: The exit code, OK or ERROR when the workbook or the output could not be used.
+    """
     try:
-        source_data = pd.read_excel(source_file)
-        print("Source data loaded successfully.")
+        if source_file.lower().endswith('.xlsx'):
+            source_data = read_columns(source_file, PRICE_STOCK_SOURCE_COLUMNS)
+        else:
+            source_data = pd.read_excel(source_file, usecols=lambda column: column.strip() in PRICE_STOCK_SOURCE_COLUMNS)
+            source_data.columns = source_data.columns.str.strip()
+        print("Source price and stock columns loaded successfully.")
     except Exception as e:
         print(f"Error loading source file: {e}")
-        return
+        return ERROR
+
+    missing = [column for column in ['slug', 'sku', 'price'] if column not in source_data.columns]
+    if missing:
+        print(f"Error: Source file has no {', '.join(missing)} column")
+        return ERROR
+
+    current = price_stock_state(map_prices_and_stock(source_data))
+    state_file = state_path(source_file)
+    previous = load_state(state_file)
+    if previous is None:
+        print(f"No imported state found at {state_file}, all variants are written")
+    changed, removed = diff_price_stock(previous, current)
+    if removed:
+        print(f"Warning: {len(removed)} SKUs are no longer in the source and are not updated: {', '.join(removed[:5])}")
+
+    try:
+        changed.to_csv(output_file, index=False)
+        print(f"{len(changed)} of {len(current)} variants changed, saved to {output_file}")
+    except Exception as e:
+        print(f"Error saving output file: {e}")
+        return ERROR
+    save_state(current, pending_path(source_file))
+    if changed.empty:
+        # Nothing to import, so the state of this run is the imported one already
+        commit_state(source_file)
+    else:
+        print(f"Run with --commit-state once {output_file} is imported into Vendure")
+    return OK
+
+
+def commit_price_stock_state(source_file):
+    """
+    Records the output of the last run as imported into Vendure (see update_prices_and_stock).
+
+    Returns:
+        int: The exit code, OK or ERROR when there is no run to commit.
+    """
+    if not commit_state(source_file):
+        print(f"Error: No pending price/stock state at {pending_path(source_file)}, nothing to commit")
+        return ERROR
+    print(f"Price/stock state committed to {state_path(source_file)}")
+    return OK
+
+
+def convert_source_to_products(source_file, output_file, facet_summary_file=None, artifact_file=None,
+                               search_index_file=None, fit_index_file=None, only=None, strict=False):
+    try:
+        # Read through the row cache; with `only`, just the matching products are read
+        source_data = load_source(source_file, only)
+        print(f"Source data loaded successfully ({len(source_data)} rows).")
+    except Exception as e:
+        print(f"Error loading source file: {e}")
+        return ERROR
+
+    if only and source_data.empty:
+        print("Error: No products match --only, nothing to map")
+        return ERROR
 
     # Strip only leading/trailing whitespace without removing internal spaces
     source_data.columns = source_data.columns.str.strip()
@@ -332,23 +450,43 @@ def convert_source_to_products(source_file, output_file):
     # Initialize a list to collect all rows
     all_rows = []
 
+    # Facet names and values are interned across the whole workbook; a partial run
+    # reuses the saved dictionary so it renders the same spellings as a full run
+    facet_index = catalog_facet_index(source_file, None if only else source_data)
+
+    # Per-cell conversions are evaluated once per distinct value of each source column
+    source_data = source_data.reset_index(drop=True)
+    evaluator = FactorizedEvaluator(source_data)
+
+    def convert(position, key, data_type):
+        return evaluator.apply(key, lambda value: convert_value(value, key, data_type), name=data_type)[position]
+
+    def html(position, key):
+        return evaluator.apply(key, clean_html, default='')[position]
+
+    def ratings(position, bar_info):
+        return {
+            source_key: evaluator.apply(source_key, parse_rating, default='Missing Key')[position]
+            for _, source_key in bar_info
+        }
+
     # Group the source data by 'slug' to handle products with multiple variants
     grouped_data = source_data.groupby('slug')
 
     for slug, group in grouped_data:
         first_row = True
-        for _, row in group.iterrows():
+        for position, row in group.iterrows():
             new_row = {}
 
             if first_row:
                 # Assign product-level fields
-                new_row['name'] = clean_and_convert(row, 'name', 'string')
-                new_row['slug'] = clean_and_convert(row, 'slug', 'string')
-                new_row['description'] = clean_html(row.get('product:shortdescription HTML:en', ''))
+                new_row['name'] = convert(position, 'name', 'string')
+                new_row['slug'] = convert(position, 'slug', 'string')
+                new_row['description'] = html(position, 'product:shortdescription HTML:en')
 #                 new_row['description:en'] = clean_html(row.get('product:shortdescription HTML:en', ''))
 #                 new_row['description:nl'] = clean_html(row.get('product:shortdescription HTML:nl', ''))
-                new_row['assets'] = clean_and_convert(row, 'assets', 'string')
-                new_row['facets'] = process_facets(row)
+                new_row['assets'] = convert(position, 'assets', 'string')
+                new_row['facets'] = process_facets(row, facet_index)
             else:
                 # For subsequent variants, leave product-level fields empty
                 new_row['name'] = ''
@@ -360,18 +498,18 @@ def convert_source_to_products(source_file, output_file):
                 new_row['facets'] = ''
 
             # General product fields (applied to all variants)
-            new_row['sku'] = clean_and_convert(row, 'sku', 'string')
-            new_row['price'] = clean_and_convert(row, 'price', 'float')
-            new_row['taxCategory'] = clean_and_convert(row, 'taxCategory', 'string')
-            new_row['stockOnHand'] = 999999
+            new_row['sku'] = convert(position, 'sku', 'string')
+            new_row['price'] = convert(position, 'price', 'float')
+            new_row['taxCategory'] = convert(position, 'taxCategory', 'string')
+            new_row['stockOnHand'] = evaluator.apply('stockOnHand', stock_on_hand, default=float('nan'))[position]
             new_row['trackInventory'] = True
-            new_row['variantAssets'] = clean_and_convert(row, 'variantAssets', 'string')
-            new_row['variantFacets'] = clean_and_convert(row, 'variantFacets', 'string')
-            new_row['variant:frontPhoto'] = clean_and_convert(row, 'Carrouselasset: topPhoto', 'relation')
-            new_row['variant:backPhoto'] = clean_and_convert(row, 'Carrouselasset: BasePhoto', 'relation')
+            new_row['variantAssets'] = convert(position, 'variantAssets', 'string')
+            new_row['variantFacets'] = facet_index.add(row.get('variantFacets', ''))
+            new_row['variant:frontPhoto'] = convert(position, 'Carrouselasset: topPhoto', 'relation')
+            new_row['variant:backPhoto'] = convert(position, 'Carrouselasset: BasePhoto', 'relation')
 
             # Preserve 'variant:shortdescription' logic
-            new_row['variant:shortdescription'] = clean_html(row.get('product:shortdescription HTML:en', ''))
+            new_row['variant:shortdescription'] = html(position, 'product:shortdescription HTML:en')
 #             new_row['variant:shortdescription:nl'] = clean_html(row.get('product:shortdescription HTML:nl', ''))
 #             new_row['variant:shortdescription:en'] = clean_html(row.get('product:shortdescription HTML:en', ''))
 
@@ -390,53 +528,53 @@ def convert_source_to_products(source_file, output_file):
             # Process description tabs
             new_row['variant:descriptionTab1Label'] = 'Description'
             new_row['variant:descriptionTab1Visible'] = True
-            new_row['variant:descriptionTab1Content'] = clean_html(row.get('product:longdescription HTML:en', ''))
+            new_row['variant:descriptionTab1Content'] = html(position, 'product:longdescription HTML:en')
 #             new_row['variant:descriptionTab1Content:nl'] = clean_html(row.get('product:longdescription HTML:nl', ''))
 #             new_row['variant:descriptionTab1Content:en'] = clean_html(row.get('product:longdescription HTML:en', ''))
 
 
-            new_row['variant:noseWidth'] = clean_and_convert(row, 'variant:nose width(cm)', 'float')
-            new_row['variant:waistWidth'] = clean_and_convert(row, 'variant:waist width(cm)', 'float')
-            new_row['variant:tailWidth'] = clean_and_convert(row, 'variant:tail width(cm)', 'float')
-            new_row['variant:taper'] = clean_and_convert(row, 'variant: Taper(cm)', 'float')
-            new_row['variant:boardWidth'] = clean_and_convert(row, 'variant:boardwidth(cm)', 'string')
-            new_row['variant:bootLengthMax'] = clean_and_convert(row, 'variant:bootlength-max(cm)', 'float')
-            new_row['variant:effectiveEdge'] = clean_and_convert(row, 'variant:effective edge(cm)', 'float')
-            new_row['variant:averageSidecutRadius'] = clean_and_convert(row, 'variant:average sidecut radius(m)', 'string')
-            new_row['variant:setback'] = clean_and_convert(row, 'variant: setback(cm)', 'float')
-            new_row['variant:flex'] = clean_and_convert(row, 'variant:flex', 'string')
-            new_row['variant:stanceMin'] = clean_and_convert(row, 'variant: stance-min(cm)', 'float')
-            new_row['variant:stanceMax'] = clean_and_convert(row, 'variant: Stance-max(cm)', 'float')
-            new_row['variant:weightKg'] = clean_and_convert(row, 'variant: Weight(kg)', 'float')
-            new_row['variant:bindingSizeVariant'] = clean_and_convert(row, 'variant:bindingsize', 'string')
-            new_row['variant:riderLengthMin'] = clean_and_convert(row, 'variant:riderlength-min', 'float')
-            new_row['variant:riderLengthMax'] = clean_and_convert(row, 'variant:riderlength-max', 'float')
-            new_row['variant:riderWeightMin'] = clean_and_convert(row, 'variant:riderlength-max', 'float')
-            new_row['variant:riderWeightMax'] = clean_and_convert(row, 'variant:riderlength-max', 'float')
+            new_row['variant:noseWidth'] = convert(position, 'variant:nose width(cm)', 'float')
+            new_row['variant:waistWidth'] = convert(position, 'variant:waist width(cm)', 'float')
+            new_row['variant:tailWidth'] = convert(position, 'variant:tail width(cm)', 'float')
+            new_row['variant:taper'] = convert(position, 'variant: Taper(cm)', 'float')
+            new_row['variant:boardWidth'] = convert(position, 'variant:boardwidth(cm)', 'string')
+            new_row['variant:bootLengthMax'] = convert(position, 'variant:bootlength-max(cm)', 'float')
+            new_row['variant:effectiveEdge'] = convert(position, 'variant:effective edge(cm)', 'float')
+            new_row['variant:averageSidecutRadius'] = convert(position, 'variant:average sidecut radius(m)', 'string')
+            new_row['variant:setback'] = convert(position, 'variant: setback(cm)', 'float')
+            new_row['variant:flex'] = convert(position, 'variant:flex', 'string')
+            new_row['variant:stanceMin'] = convert(position, 'variant: stance-min(cm)', 'float')
+            new_row['variant:stanceMax'] = convert(position, 'variant: Stance-max(cm)', 'float')
+            new_row['variant:weightKg'] = convert(position, 'variant: Weight(kg)', 'float')
+            new_row['variant:bindingSizeVariant'] = convert(position, 'variant:bindingsize', 'string')
+            new_row['variant:riderLengthMin'] = convert(position, 'variant:riderlength-min', 'float')
+            new_row['variant:riderLengthMax'] = convert(position, 'variant:riderlength-max', 'float')
+            new_row['variant:riderWeightMin'] = convert(position, 'variant:riderlength-max', 'float')
+            new_row['variant:riderWeightMax'] = convert(position, 'variant:riderlength-max', 'float')
 
 
             if first_row:
-                new_row['product:brand'] = clean_and_convert(row, 'product:Brand', 'string')
-                new_row['product:warranty'] = clean_and_convert(row, 'product:warranty', 'string')
-                new_row['product:eanCode'] = clean_and_convert(row, 'Product:EAN code', 'string')
-                new_row['product:quote'] = clean_and_convert(row, 'product:quote', 'string')
-                new_row['product:quoteOwner'] = clean_and_convert(row, 'product:quote-owner', 'string')
-                new_row['product:boardCategory'] = clean_and_convert(row, 'Product:boardcategory', 'string')
-                new_row['product:terrain'] = clean_and_convert(row, 'Product:terrain', 'string')
-                new_row['product:camberProfile'] = clean_and_convert(row, 'Product:camberprofile', 'string')
-                new_row['product:profile'] = clean_and_convert(row, 'Product:profile', 'string')
-                new_row['product:baseProfile'] = clean_and_convert(row, 'Product:baseprofile', 'string')
-                new_row['product:rider'] = clean_and_convert(row, 'Product:rider', 'string')
-                new_row['product:taperProfile'] = clean_and_convert(row, 'Product: Taper profile', 'string')
-                new_row['product:bindingSize'] = clean_and_convert(row, 'Product:bindingsize', 'string')
-                new_row['product:bindingMount'] = clean_and_convert(row, 'Product: bindingmount', 'string')
-                new_row['product:edges'] = clean_and_convert(row, 'Product: edges', 'string')
-                new_row['product:sidewall'] = clean_and_convert(row, 'Product: Sidewall', 'string')
-                new_row['product:core'] = clean_and_convert(row, 'Product: Core', 'string')
-                new_row['product:layup1'] = clean_and_convert(row, 'Product: lay-up', 'string')
-                new_row['product:layup2'] = clean_and_convert(row, 'Product: lay-up', 'string')
-                new_row['product:layup3'] = clean_and_convert(row, 'Product: lay-up', 'string')
-                new_row['product:boardbase'] = clean_and_convert(row, 'Product: base', 'string')
+                new_row['product:brand'] = convert(position, 'product:Brand', 'string')
+                new_row['product:warranty'] = convert(position, 'product:warranty', 'string')
+                new_row['product:eanCode'] = convert(position, 'Product:EAN code', 'string')
+                new_row['product:quote'] = convert(position, 'product:quote', 'string')
+                new_row['product:quoteOwner'] = convert(position, 'product:quote-owner', 'string')
+                new_row['product:boardCategory'] = convert(position, 'Product:boardcategory', 'string')
+                new_row['product:terrain'] = convert(position, 'Product:terrain', 'string')
+                new_row['product:camberProfile'] = convert(position, 'Product:camberprofile', 'string')
+                new_row['product:profile'] = convert(position, 'Product:profile', 'string')
+                new_row['product:baseProfile'] = convert(position, 'Product:baseprofile', 'string')
+                new_row['product:rider'] = convert(position, 'Product:rider', 'string')
+                new_row['product:taperProfile'] = convert(position, 'Product: Taper profile', 'string')
+                new_row['product:bindingSize'] = convert(position, 'Product:bindingsize', 'string')
+                new_row['product:bindingMount'] = convert(position, 'Product: bindingmount', 'string')
+                new_row['product:edges'] = convert(position, 'Product: edges', 'string')
+                new_row['product:sidewall'] = convert(position, 'Product: Sidewall', 'string')
+                new_row['product:core'] = convert(position, 'Product: Core', 'string')
+                new_row['product:layup1'] = convert(position, 'Product: lay-up', 'string')
+                new_row['product:layup2'] = convert(position, 'Product: lay-up', 'string')
+                new_row['product:layup3'] = convert(position, 'Product: lay-up', 'string')
+                new_row['product:boardbase'] = convert(position, 'Product: base', 'string')
             else:
                 new_row['product:brand'] = ''
                 new_row['product:warranty'] = ''
@@ -466,12 +604,12 @@ def convert_source_to_products(source_file, output_file):
                 ('Difficulty rider level rating', 'variant:Riderlevel'),
                 ('Difficulty flex rating', 'variant:Flex'),
             ]
-            tab1_bars, tab1_visible = parse_and_process_bars(row, tab1_bars_info, tab_id=1)
+            tab1_bars, tab1_visible = parse_and_process_bars(row, tab1_bars_info, tab_id=1, ratings=ratings(position, tab1_bars_info))
             new_row['variant:optionTab1Label'] = 'Rider level'
-            new_row['variant:optionTab1Visible'] = str(tab1_visible)
+            new_row['variant:optionTab1Visible'] = bool(tab1_visible)
             for i, bar in enumerate(tab1_bars, start=1):
                 new_row[f'variant:optionTab1Bar{i}Name'] = bar['name']
-                new_row[f'variant:optionTab1Bar{i}Visible'] = str(bar['visible'])
+                new_row[f'variant:optionTab1Bar{i}Visible'] = bool(bar['visible'])
                 new_row[f'variant:optionTab1Bar{i}MinLabel'] = bar['minLabel']
                 new_row[f'variant:optionTab1Bar{i}MaxLabel'] = bar['maxLabel']
                 new_row[f'variant:optionTab1Bar{i}Min'] = bar['min']
@@ -484,12 +622,12 @@ def convert_source_to_products(source_file, output_file):
                 ('All Mountain', 'variant:All mountain'),
                 ('Resort', 'variant:Freestyle'),
             ]
-            tab2_bars, tab2_visible = parse_and_process_bars(row, tab2_bars_info, tab_id=2)
+            tab2_bars, tab2_visible = parse_and_process_bars(row, tab2_bars_info, tab_id=2, ratings=ratings(position, tab2_bars_info))
             new_row['variant:optionTab2Label'] = 'Terrain'
-            new_row['variant:optionTab2Visible'] = str(tab2_visible)
+            new_row['variant:optionTab2Visible'] = bool(tab2_visible)
             for i, bar in enumerate(tab2_bars, start=1):
                 new_row[f'variant:optionTab2Bar{i}Name'] = bar['name']
-                new_row[f'variant:optionTab2Bar{i}Visible'] = str(bar['visible'])
+                new_row[f'variant:optionTab2Bar{i}Visible'] = bool(bar['visible'])
                 new_row[f'variant:optionTab2Bar{i}MinLabel'] = bar['minLabel']
                 new_row[f'variant:optionTab2Bar{i}MaxLabel'] = bar['maxLabel']
                 new_row[f'variant:optionTab2Bar{i}Rating'] = bar['rating']
@@ -507,14 +645,71 @@ def convert_source_to_products(source_file, output_file):
     print("Sample 'description' and 'variant:descriptionTab1Content' data:")
     print(converted_data[['slug', 'description', 'variant:descriptionTab1Content']].head())
 
-    # Optional: Fill NaN with empty strings to avoid issues in CSV
-    converted_data.fillna('', inplace=True)
+    # Convert to the declared column types; missing values become nulls
+    converted_data = apply_schema(converted_data)
+
+    # Data-quality rules run on the typed catalog before anything is written
+    quality = run_quality_rules(converted_data)
+    if strict and quality == ERROR:
+        print("Error: Data-quality rules failed, no output written (--strict)")
+        return quality
+
+    facet_summary = facet_index.summary()
+    print(f"Facet index: {len(facet_index.names)} facets, {len(facet_index.values)} facet values")
+
+    # Uniqueness ratio per converted source column (lower means more work shared)
+    print("Factorized conversions:")
+    print(evaluator.report().to_string(index=False))
+
+    if artifact_file:
+        try:
+            write_artifact(converted_data, artifact_file)
+            print(f"Typed artifact saved to {artifact_file}")
+            # The CSV is rendered from the artifact as written
+            converted_data = read_artifact(artifact_file)
+        except ImportError:
+            print("Error: Writing the typed artifact requires pyarrow (pip install pyarrow)")
+            quality = ERROR
+        except Exception as e:
+            print(f"Error saving typed artifact: {e}")
+            quality = ERROR
+
+    if search_index_file:
+        try:
+            counts = build_search_index(converted_data, search_index_file)
+            print(f"Search index saved to {search_index_file}: {counts}")
+        except Exception as e:
+            print(f"Error building search index: {e}")
+            quality = ERROR
+
+    if fit_index_file:
+        try:
+            build_fit_index_from_catalog(converted_data, fit_index_file)
+            print(f"Fit index saved to {fit_index_file}")
+        except Exception as e:
+            print(f"Error building fit index: {e}")
+            quality = ERROR
 
     try:
-        converted_data.to_csv(output_file, index=False)
+        render_vendure_csv(converted_data, output_file)
         print(f"File saved to {output_file}")
+        if not only:
+            # Later --prices-stock-only runs only write what changed since this import, once confirmed
+            save_state(price_stock_state(converted_data), pending_path(source_file))
+            print(f"Run with --commit-state once {output_file} is imported into Vendure")
     except Exception as e:
         print(f"Error saving output file: {e}")
+        quality = ERROR
+
+    if facet_summary_file:
+        try:
+            facet_summary.to_csv(facet_summary_file, index=False)
+            print(f"Facet summary saved to {facet_summary_file}")
+        except Exception as e:
+            print(f"Error saving facet summary: {e}")
+            quality = ERROR
+
+    return quality
 
 
 
@@ -530,7 +725,55 @@ def parse_arguments():
     parser.add_argument(
         'output_file',
         type=str,
-        help='Path to the output CSV file (e.g., mapped.csv)'
+        nargs='?',
+        help='Path to the output CSV file (e.g., mapped.csv), not needed with --commit-state'
+    )
+    parser.add_argument(
+        '--facet-summary',
+        type=str,
+        default=None,
+        help='Optional path for a CSV with the number of rows per facet value (e.g., facets.csv)'
+    )
+    parser.add_argument(
+        '--artifact',
+        type=str,
+        default=None,
+        help='Optional path for the typed Arrow catalog artifact (e.g., mapped.arrow)'
+    )
+    parser.add_argument(
+        '--search-index',
+        type=str,
+        default=None,
+        help='Optional path for the SQLite storefront search index, updated per slug (e.g., search.sqlite)'
+    )
+    parser.add_argument(
+        '--fit-index',
+        type=str,
+        default=None,
+        help='Optional path for the memory-mapped rider fit index (e.g., fit.idx)'
+    )
+    parser.add_argument(
+        '--only',
+        type=str,
+        action='append',
+        default=None,
+        help='Only map the products matching slug=..., sku=... or brand=... (repeatable)'
+    )
+    parser.add_argument(
+        '--strict',
+        action='store_true',
+        help='Do not write any output when a data-quality rule with severity error fails'
+    )
+    parser.add_argument(
+        '--prices-stock-only',
+        action='store_true',
+        help='Only read prices and stock and write the variants that changed since the last import to output_file'
+    )
+    parser.add_argument(
+        '--commit-state',
+        action='store_true',
+        help='Record the output of the last run as imported into Vendure, so the next --prices-stock-only '
+             'run only writes what changed since'
     )
     return parser.parse_args()
 
@@ -542,12 +785,54 @@ def main():
         print("Error: Input file must be an Excel file with extension .xlsx or .xls")
         sys.exit(1)
 
+    if args.commit_state:
+        if (args.output_file or args.only or args.strict or args.facet_summary or args.artifact
+                or args.search_index or args.fit_index or args.prices_stock_only):
+            print("Error: --commit-state only takes the input file")
+            sys.exit(1)
+        sys.exit(commit_price_stock_state(args.input_file))
+
     # Validate output file extension
+    if not args.output_file:
+        print("Error: Output file is required")
+        sys.exit(1)
     if not args.output_file.lower().endswith('.csv'):
         print("Error: Output file must have a .csv extension")
         sys.exit(1)
 
-    convert_source_to_products(args.input_file, args.output_file)
+    # Validate artifact file extension
+    if args.artifact and not args.artifact.lower().endswith('.arrow'):
+        print("Error: Artifact file must have a .arrow extension")
+        sys.exit(1)
+
+    try:
+        only = parse_only(args.only)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Partial runs must not prune the products they did not map from the indexes
+    if only and (args.search_index or args.fit_index):
+        print("Error: --only cannot be combined with --search-index or --fit-index")
+        sys.exit(1)
+
+    # Price/stock runs read only the price columns and write nothing but the changed variants
+    if args.prices_stock_only and (only or args.strict or args.facet_summary or args.artifact
+                                   or args.search_index or args.fit_index):
+        print("Error: --prices-stock-only cannot be combined with --only, --strict, --facet-summary, "
+              "--artifact, --search-index or --fit-index")
+        sys.exit(1)
+
+    if args.prices_stock_only:
+        sys.exit(update_prices_and_stock(args.input_file, args.output_file))
+
+    # The exit code is the worst data-quality severity: 0 ok, 1 warnings, 2 errors,
+    # and 2 as well when the source could not be read or an output could not be written
+    quality = convert_source_to_products(
+        args.input_file, args.output_file, args.facet_summary, args.artifact, args.search_index,
+        args.fit_index, only, args.strict
+    )
+    sys.exit(quality)
 
 if __name__ == '__main__':
     main()
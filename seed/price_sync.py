@@ -0,0 +1,104 @@
+import os
+
+import pandas as pd
+
+from source_cache import cache_dir
+
+# Source columns read in price/stock-only mode
+PRICE_STOCK_SOURCE_COLUMNS = ['slug', 'sku', 'price', 'stockOnHand', 'taxCategory']
+
+# Columns of the persisted state and of the update file, keyed by SKU
+PRICE_STOCK_COLUMNS = ['sku', 'price', 'stockOnHand', 'taxCategory']
+
+# Stock level used when the workbook leaves stockOnHand empty
+DEFAULT_STOCK_ON_HAND = 999999
+
+
+def state_path(source_file):
+    """
+    Returns the path of the price/stock state last imported into Vendure for a workbook.
+    """
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(cache_dir(source_file), f'{stem}.prices.csv')
+
+
+def pending_path(source_file):
+    """
+    Returns the path of the price/stock state of the last run, which becomes the
+    imported state once its output is confirmed (see commit_state).
+    """
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(cache_dir(source_file), f'{stem}.prices.pending.csv')
+
+
+def price_stock_state(frame):
+    """
+    Reduces mapped variants to their price/stock state: one row per SKU, with all
+    values as strings so that runs compare exactly. Variants without SKU cannot be
+    updated and are left out; for duplicate SKUs the last row wins, as on import.
+
+    Args:
+        frame (pd.DataFrame): Mapped variants with at least PRICE_STOCK_COLUMNS.
+
+    Returns:
+        pd.DataFrame: The state, indexed by SKU.
+    """
+    state = frame[PRICE_STOCK_COLUMNS].astype('string').fillna('')
+    state = state[state['sku'] != '']
+    duplicates = state['sku'].duplicated(keep='last')
+    if duplicates.any():
+        print(f"Warning: {duplicates.sum()} duplicate SKUs, keeping the last row of each: "
+              f"{', '.join(state.loc[duplicates, 'sku'].unique()[:5])}")
+    return state[~duplicates].set_index('sku')
+
+
+def load_state(path):
+    """
+    Loads the state saved by the last run, or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False).set_index('sku')
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state.to_csv(path)
+
+
+def commit_state(source_file):
+    """
+    Makes the pending state of the last run the imported state, so the next
+    price/stock run only writes what changed since.
+
+    Returns:
+        bool: False when there is no pending state.
+    """
+    pending = pending_path(source_file)
+    if not os.path.exists(pending):
+        return False
+    os.replace(pending, state_path(source_file))
+    return True
+
+
+def diff_price_stock(previous, current):
+    """
+    Returns the SKUs that are new or whose price, stock or tax category changed.
+
+    Args:
+        previous (pd.DataFrame): State of the last run (see price_stock_state), or None.
+        current (pd.DataFrame): State of this run.
+
+    Returns:
+        tuple: (pd.DataFrame of changed rows with PRICE_STOCK_COLUMNS, list of SKUs
+        that disappeared since the last run)
+    """
+    if previous is None:
+        return current.reset_index(), []
+
+    previous = previous.reindex(columns=current.columns, fill_value='')
+    known = current.index.isin(previous.index)
+    before = previous.reindex(current.index).fillna('')
+    changed = ~known | (current != before).any(axis=1).to_numpy()
+    removed = previous.index[~previous.index.isin(current.index)].tolist()
+    return current[changed].reset_index(), removed
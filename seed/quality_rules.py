@@ -0,0 +1,235 @@
+import argparse
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog_artifact import CATALOG_SCHEMA, column_type, read_mapped_catalog
+
+# Severities, which double as exit codes
+OK = 0
+WARNING = 1
+ERROR = 2
+
+SEVERITY_NAMES = {OK: 'ok', WARNING: 'warning', ERROR: 'error'}
+
+RATING_COLUMNS = [column for column in CATALOG_SCHEMA if column.endswith('Rating')]
+
+# Rules are Python expressions over whole mapped columns (names in backticks),
+# evaluated once per rule as array operations. A row violates a rule when its
+# expression is True. Numeric and flag columns are float arrays with NaN for
+# missing values, so comparisons with a missing value are False. missing(column)
+# is True for NaN, null and empty text.
+QUALITY_RULES = [
+    {
+        'name': 'nose-narrower-than-waist',
+        'severity': ERROR,
+        'expression': '`variant:noseWidth` < `variant:waistWidth`',
+        'description': 'Nose width is smaller than the waist width (often mm mixed with cm)',
+    },
+    {
+        'name': 'tail-narrower-than-waist',
+        'severity': ERROR,
+        'expression': '`variant:tailWidth` < `variant:waistWidth`',
+        'description': 'Tail width is smaller than the waist width (often mm mixed with cm)',
+    },
+    {
+        'name': 'stance-inverted',
+        'severity': ERROR,
+        'expression': '`variant:stanceMin` > `variant:stanceMax`',
+        'description': 'Minimum stance is larger than the maximum stance',
+    },
+    {
+        'name': 'rider-length-inverted',
+        'severity': ERROR,
+        'expression': '`variant:riderLengthMin` > `variant:riderLengthMax`',
+        'description': 'Minimum rider length is larger than the maximum rider length',
+    },
+    {
+        'name': 'rating-out-of-range',
+        'severity': ERROR,
+        'expression': ' | '.join(f'(`{column}` > 100) | (`{column}` < 0)' for column in RATING_COLUMNS),
+        'description': 'A rating bar is outside 0-100',
+    },
+    {
+        'name': 'negative-price',
+        'severity': ERROR,
+        'expression': '`price` < 0',
+        'description': 'Price is negative',
+    },
+    {
+        'name': 'missing-price',
+        'severity': ERROR,
+        'expression': 'missing(`price`)',
+        'description': 'Price is missing',
+    },
+    {
+        'name': 'missing-product-assets',
+        'severity': WARNING,
+        'expression': "~missing(`slug`) & missing(`assets`)",
+        'description': 'Product has no assets',
+    },
+    {
+        'name': 'missing-board-photo',
+        'severity': WARNING,
+        'expression': "missing(`variant:frontPhoto`) | missing(`variant:backPhoto`)",
+        'description': 'Variant has no front or back photo',
+    },
+    {
+        'name': 'rider-weight-copied-from-length',
+        'severity': WARNING,
+        # The same test as fit_index.FLAG_WEIGHT_COPIED, which the fit index leaves to this rule
+        'expression': '((`variant:riderWeightMin` == `variant:riderLengthMax`)'
+                      ' & (`variant:riderWeightMax` == `variant:riderLengthMax`))'
+                      ' | ((`variant:riderWeightMin` == `variant:riderLengthMin`)'
+                      ' & (`variant:riderWeightMax` == `variant:riderLengthMax`))',
+        'description': "Rider weight range equals the rider length values; map_pim reads "
+                       "riderWeightMin/Max from 'variant:riderlength-max'",
+    },
+]
+
+
+def rule_columns(rule):
+    columns = re.findall(r'`([^`]+)`', rule['expression'])
+    return list(dict.fromkeys(columns))
+
+
+def compile_rule(rule):
+    """
+    Compiles the rule expression, with every `column` read from the `columns` mapping.
+    """
+    source = re.sub(r'`([^`]+)`', lambda match: f'columns[{match.group(1)!r}]', rule['expression'])
+    return compile(source, rule['name'], 'eval')
+
+
+def missing(values):
+    """
+    Returns True for missing values: NaN in float arrays, null or '' in text columns.
+    """
+    if isinstance(values, np.ndarray):
+        return np.isnan(values)
+    return values.isna().to_numpy() | (values == '').to_numpy(dtype=bool, na_value=False)
+
+
+def rule_columns_for(frame, columns):
+    """
+    Returns the columns the rules read: numeric and flag columns as float arrays with
+    NaN for missing values, text columns as they are.
+    """
+    prepared = {}
+    for column in columns:
+        if column_type(column) in ['float', 'int', 'bool']:
+            prepared[column] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            prepared[column] = frame[column]
+    return prepared
+
+
+def check_quality(frame, rules=QUALITY_RULES, samples=3):
+    """
+    Evaluates the quality rules over the whole mapped catalog.
+
+    Args:
+        frame (pd.DataFrame): Typed mapped catalog (see catalog_artifact.apply_schema).
+        rules (list): Rules as declared in QUALITY_RULES.
+        samples (int): Number of violating row positions kept per rule.
+
+    Returns:
+        tuple: (pd.DataFrame with one row per rule, the worst violated severity)
+    """
+    columns = {column for rule in rules for column in rule_columns(rule) if column in frame.columns}
+    namespace = {'columns': rule_columns_for(frame, columns), 'missing': missing}
+
+    results = []
+    worst = OK
+    for rule in rules:
+        if any(column not in frame.columns for column in rule_columns(rule)):
+            # e.g. a catalog mapped before the column existed
+            violations, rows = None, []
+        else:
+            violated = eval(compile_rule(rule), namespace)
+            if isinstance(violated, pd.Series):
+                violated = violated.to_numpy(dtype=bool, na_value=False)
+            rows = np.flatnonzero(violated)
+            violations = len(rows)
+            if violations:
+                worst = max(worst, rule['severity'])
+        results.append({
+            'rule': rule['name'],
+            'severity': SEVERITY_NAMES[rule['severity']],
+            'violations': violations,
+            'sampleRows': list(rows[:samples]),
+            'description': rule['description'],
+        })
+    return pd.DataFrame(results), worst
+
+
+def print_quality_report(report, frame, rules=QUALITY_RULES):
+    """
+    Prints the violation counts per rule and the sample rows of every violated rule.
+    """
+    print(report[['rule', 'severity', 'violations']].to_string(index=False, na_rep='skipped'))
+    expressions = {rule['name']: rule for rule in rules}
+    for result in report.itertuples(index=False):
+        if not result.violations:
+            continue
+        print(f"{result.severity.capitalize()}: {result.rule}: {result.description} ({result.violations} rows)")
+        shown = [column for column in ['sku'] + rule_columns(expressions[result.rule]) if column in frame.columns]
+        print(frame.iloc[result.sampleRows][list(dict.fromkeys(shown))].to_string())
+
+
+def run_quality_rules(frame):
+    """
+    Checks the mapped catalog, prints the report and returns the exit code
+    (OK, WARNING or ERROR).
+    """
+    started = time.perf_counter()
+    report, worst = check_quality(frame)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"Quality rules: {len(report)} rules on {len(frame)} variants in {elapsed:.1f} ms")
+    print_quality_report(report, frame)
+    return worst
+
+
+def benchmark(frame, variants, repeat=5):
+    frame = pd.concat([frame] * (variants // len(frame) + 1), ignore_index=True).iloc[:variants]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        check_quality(frame)
+        timings.append(time.perf_counter() - started)
+    print(f"{len(QUALITY_RULES)} rules on {len(frame)} variants: best {min(timings) * 1000:.1f} ms, "
+          f"mean {np.mean(timings) * 1000:.1f} ms")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Check the mapped catalog against the data-quality rules.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser('check', help='Check the mapped catalog; the exit code is the worst severity')
+    check_parser.add_argument('input_file', type=str, help='Mapped CSV or typed artifact (e.g., mapped.arrow)')
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark the rules on the catalog repeated to a given size')
+    bench_parser.add_argument('input_file', type=str, help='Mapped CSV or typed artifact (e.g., mapped.arrow)')
+    bench_parser.add_argument('--variants', type=int, default=100000, help='Number of variants')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    try:
+        frame = read_mapped_catalog(args.input_file)
+    except Exception as e:
+        print(f"Error loading mapped catalog: {e}")
+        sys.exit(ERROR)
+
+    if args.command == 'check':
+        sys.exit(run_quality_rules(frame))
+    benchmark(frame, args.variants)
+
+
+if __name__ == '__main__':
+    main()
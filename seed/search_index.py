@@ -0,0 +1,405 @@
+import argparse
+import functools
+import hashlib
+import html
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from catalog_artifact import read_mapped_catalog
+
+# Variant columns stored as numeric fields for range filters
+NUMERIC_FIELDS = {
+    'price': 'price',
+    'variant:waistWidth': 'waist_width',
+    'variant:effectiveEdge': 'effective_edge',
+    'variant:setback': 'setback',
+    'variant:stanceMin': 'stance_min',
+    'variant:stanceMax': 'stance_max',
+    'variant:weightKg': 'weight_kg',
+    'variant:bootLengthMax': 'boot_length_max',
+    'variant:riderLengthMin': 'rider_length_min',
+    'variant:riderLengthMax': 'rider_length_max',
+    'variant:riderWeightMin': 'rider_weight_min',
+    'variant:riderWeightMax': 'rider_weight_max',
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    doc_hash TEXT NOT NULL,
+    name TEXT,
+    brand TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+    name, brand, terrain, category, facets, description,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS facet_values (
+    id INTEGER PRIMARY KEY,
+    facet TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (facet, value)
+);
+CREATE TABLE IF NOT EXISTS facet_postings (
+    value_id INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    PRIMARY KEY (value_id, document_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS facet_postings_document ON facet_postings (document_id);
+CREATE TABLE IF NOT EXISTS variants (
+    sku TEXT,
+    document_id INTEGER NOT NULL,
+    {', '.join(f'{field} REAL' for field in NUMERIC_FIELDS.values())}
+);
+CREATE INDEX IF NOT EXISTS variants_document ON variants (document_id);
+"""
+
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def _text(value):
+    if value is None or value is pd.NA or value != value:
+        return ''
+    return str(value).strip()
+
+
+def _number(value):
+    if value is None or value is pd.NA or value != value:
+        return None
+    return float(value)
+
+
+def plain_text(raw_html):
+    """
+    Sanitizes a description for indexing: strips all tags, unescapes entities
+    and collapses whitespace.
+    """
+    return re.sub(r'\s+', ' ', html.unescape(TAG_PATTERN.sub(' ', _text(raw_html)))).strip()
+
+
+def normalize_term(value):
+    return re.sub(r'\s+', ' ', str(value)).strip().casefold()
+
+
+@functools.lru_cache(maxsize=None)
+def _facet_string_pairs(facets):
+    pairs = []
+    for part in facets.split('|'):
+        if ':' in part:
+            name, value = part.split(':', 1)
+            pair = (normalize_term(name), normalize_term(value))
+            if pair[0] and pair[1]:
+                pairs.append(pair)
+    return tuple(pairs)
+
+
+def parse_facet_pairs(*facet_strings):
+    """
+    Splits rendered facet strings ("Brand:Dupraz|Rider:Uni") into normalized (facet, value) pairs.
+    Each distinct facet string is only parsed once.
+    """
+    pairs = []
+    for facets in facet_strings:
+        for pair in _facet_string_pairs(_text(facets)):
+            if pair not in pairs:
+                pairs.append(pair)
+    return pairs
+
+
+def product_documents(frame):
+    """
+    Groups the mapped catalog into one search document per product.
+    Variant rows follow their product row, which is the only row carrying the slug.
+
+    The hash is taken over the raw source values, so unchanged products are
+    skipped before any tokenizing or HTML stripping happens.
+
+    Yields:
+        tuple: (slug, doc_hash, raw product tuple, list of variant tuples (sku, *NUMERIC_FIELDS))
+    """
+    def column(name):
+        if name not in frame.columns:
+            return [None] * len(frame)
+        return frame[name].to_numpy(dtype=object, na_value=None).tolist()
+
+    # Work on plain Python lists; per-group DataFrame access is far too slow at 100k rows
+    slugs = [_text(slug) for slug in column('slug')]
+    variant_facets = column('variantFacets')
+    variant_rows = list(zip(column('sku'), *(column(source) for source in NUMERIC_FIELDS)))
+    product_rows = list(zip(*(column(name) for name in
+                              ['name', 'product:brand', 'product:terrain', 'product:boardCategory',
+                               'facets', 'description'])))
+
+    starts = [position for position, slug in enumerate(slugs) if slug]
+    for start, end in zip(starts, starts[1:] + [len(slugs)]):
+        raw = product_rows[start] + (tuple(variant_facets[start:end]),)
+        variants = variant_rows[start:end]
+        doc_hash = hashlib.sha1(repr((raw, variants)).encode('utf-8')).hexdigest()
+        yield slugs[start], doc_hash, raw, variants
+
+
+def make_document(raw):
+    """
+    Builds the searchable document of a product from the raw tuple yielded by product_documents.
+    """
+    name, brand, terrain, category, facets, description, variant_facets = raw
+    return {
+        'name': _text(name),
+        'brand': _text(brand),
+        'terrain': _text(terrain),
+        'category': _text(category),
+        'facets': parse_facet_pairs(facets, *variant_facets),
+        'description': plain_text(description),
+    }
+
+
+def build_search_index(frame, db_path):
+    """
+    Builds or incrementally updates the search index for the mapped catalog.
+
+    Only products whose document hash changed are re-indexed; products that are
+    no longer in the catalog are removed.
+
+    Returns:
+        dict: Counts of 'added', 'updated', 'removed' and 'unchanged' products.
+    """
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.executescript(SCHEMA)
+        existing = {slug: (doc_id, doc_hash) for doc_id, slug, doc_hash in
+                    connection.execute('SELECT id, slug, doc_hash FROM documents')}
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        seen = set()
+        numeric_columns = list(NUMERIC_FIELDS.values())
+        value_ids = {(facet, value): value_id for value_id, facet, value in
+                     connection.execute('SELECT id, facet, value FROM facet_values')}
+        new_values = []
+        postings = []
+        variant_rows = []
+
+        with connection:
+            for slug, doc_hash, raw, variants in product_documents(frame):
+                seen.add(slug)
+                current = existing.get(slug)
+                if current and current[1] == doc_hash:
+                    counts['unchanged'] += 1
+                    continue
+                if current:
+                    _delete_documents(connection, [current[0]])
+                    counts['updated'] += 1
+                else:
+                    counts['added'] += 1
+                document = make_document(raw)
+
+                doc_id = connection.execute(
+                    'INSERT INTO documents (slug, doc_hash, name, brand) VALUES (?, ?, ?, ?)',
+                    (slug, doc_hash, document['name'], document['brand']),
+                ).lastrowid
+                connection.execute(
+                    'INSERT INTO product_fts (rowid, name, brand, terrain, category, facets, description) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (doc_id, document['name'], document['brand'], document['terrain'], document['category'],
+                     ' '.join(value for _, value in document['facets']), document['description']),
+                )
+                for pair in document['facets']:
+                    value_id = value_ids.get(pair)
+                    if value_id is None:
+                        value_id = len(value_ids) + 1
+                        value_ids[pair] = value_id
+                        new_values.append((value_id,) + pair)
+                    postings.append((value_id, doc_id))
+                variant_rows.extend(
+                    (_text(variant[0]), doc_id) + tuple(_number(value) for value in variant[1:])
+                    for variant in variants
+                )
+
+            # Postings and variants are inserted in one batch each, sorted in key order
+            postings.sort()
+            connection.executemany('INSERT INTO facet_values (id, facet, value) VALUES (?, ?, ?)', new_values)
+            connection.executemany('INSERT INTO facet_postings (value_id, document_id) VALUES (?, ?)', postings)
+            connection.executemany(
+                f'INSERT INTO variants (sku, document_id, {", ".join(numeric_columns)}) '
+                f'VALUES (?, ?, {", ".join("?" for _ in numeric_columns)})',
+                variant_rows,
+            )
+
+            removed = [doc_id for slug, (doc_id, _) in existing.items() if slug not in seen]
+            _delete_documents(connection, removed)
+            counts['removed'] = len(removed)
+        return counts
+    finally:
+        connection.close()
+
+
+def _delete_documents(connection, doc_ids):
+    for doc_id in doc_ids:
+        connection.execute('DELETE FROM product_fts WHERE rowid = ?', (doc_id,))
+        connection.execute('DELETE FROM facet_postings WHERE document_id = ?', (doc_id,))
+        connection.execute('DELETE FROM variants WHERE document_id = ?', (doc_id,))
+        connection.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query of quoted prefix terms, e.g. 'all mount' -> '"all"* "mount"*'.
+    """
+    terms = re.findall(r'\w+', text.casefold())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(connection, text='', facets=None, ranges=None, limit=20):
+    """
+    Searches the index.
+
+    Args:
+        connection (sqlite3.Connection): Open connection to the index.
+        text (str): Free text, matched as prefixes against all searchable fields.
+        facets (list): (facet, value) pairs that must all match, e.g. [('Brand', 'Dupraz')].
+        ranges (dict): Numeric field -> (min, max) that at least one variant must satisfy,
+            e.g. {'rider_length_max': (180, None)}. None leaves a bound open.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list: (slug, name, score) tuples, best match first.
+    """
+    query = fts_query(text or '')
+    params = []
+    if query:
+        sql = ('SELECT d.slug, d.name, bm25(product_fts) AS score FROM product_fts '
+               'JOIN documents d ON d.id = product_fts.rowid WHERE product_fts MATCH ?')
+        params.append(query)
+    else:
+        sql = 'SELECT d.slug, d.name, 0.0 AS score FROM documents d WHERE 1 = 1'
+
+    for facet, value in facets or []:
+        sql += (' AND d.id IN (SELECT p.document_id FROM facet_postings p '
+                'JOIN facet_values f ON f.id = p.value_id WHERE f.facet = ? AND f.value = ?)')
+        params.extend([normalize_term(facet), normalize_term(value)])
+
+    conditions = []
+    for field, (low, high) in (ranges or {}).items():
+        if field not in NUMERIC_FIELDS.values():
+            raise ValueError(f"Unknown numeric field '{field}'")
+        if low is not None:
+            conditions.append(f'v.{field} >= ?')
+            params.append(low)
+        if high is not None:
+            conditions.append(f'v.{field} <= ?')
+            params.append(high)
+    if conditions:
+        sql += f' AND EXISTS (SELECT 1 FROM variants v WHERE v.document_id = d.id AND {" AND ".join(conditions)})'
+
+    sql += ' ORDER BY score LIMIT ?'
+    params.append(limit)
+    return connection.execute(sql, params).fetchall()
+
+
+def scale_catalog(frame, variants):
+    """
+    Repeats the catalog with unique slugs and SKUs until it has at least `variants` rows.
+    """
+    copies = []
+    for copy in range(-(-variants // len(frame))):
+        part = frame.copy()
+        part['slug'] = part['slug'].astype(object).map(lambda s: f'{s}-{copy}' if _text(s) else s)
+        part['sku'] = part['sku'].astype(object).map(lambda s: f'{s}-{copy}')
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True).iloc[:variants]
+
+
+def benchmark(frame, variants, queries, repeat=50):
+    """
+    Times a full build, a no-op incremental rebuild and a set of queries.
+    """
+    frame = scale_catalog(frame, variants)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'search.sqlite')
+
+        started = time.perf_counter()
+        counts = build_search_index(frame, db_path)
+        print(f"Full build: {len(frame)} variants, {counts['added']} products in {time.perf_counter() - started:.3f}s")
+
+        started = time.perf_counter()
+        counts = build_search_index(frame, db_path)
+        print(f"Incremental rebuild: {counts['unchanged']} unchanged in {time.perf_counter() - started:.3f}s")
+
+        connection = sqlite3.connect(db_path)
+        try:
+            for text, facets, ranges in queries:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    results = search(connection, text, facets, ranges)
+                elapsed = (time.perf_counter() - started) / repeat
+                print(f"Query {text!r} facets={facets} ranges={ranges}: "
+                      f"{len(results)} results, {elapsed * 1000:.2f} ms")
+        finally:
+            connection.close()
+
+
+BENCHMARK_QUERIES = [
+    ('dupraz', None, None),
+    ('all mount', None, None),
+    ('powder', [('Rider', 'Uni')], None),
+    ('', [('Brand', 'Jones'), ('terrain', 'all mountain')], None),
+    ('camber', None, {'rider_length_max': (180, None), 'price': (None, 800)}),
+]
+
+
+def parse_facet_arguments(values):
+    """
+    Parses ['Brand=Dupraz', 'Rider=Uni'] into [('Brand', 'Dupraz'), ('Rider', 'Uni')].
+    """
+    return [tuple(value.split('=', 1)) for value in values or []]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Build and query the storefront search index.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build or update the index from the mapped catalog')
+    build_parser.add_argument('input_file', type=str, help='Mapped CSV or typed artifact (e.g., mapped.arrow)')
+    build_parser.add_argument('index_file', type=str, help='SQLite index file (e.g., search.sqlite)')
+
+    query_parser = subparsers.add_parser('query', help='Query the index')
+    query_parser.add_argument('index_file', type=str, help='SQLite index file')
+    query_parser.add_argument('text', type=str, nargs='?', default='', help='Free text query')
+    query_parser.add_argument('--facet', action='append', help='Facet filter, e.g. Brand=Dupraz (repeatable)')
+    query_parser.add_argument('--limit', type=int, default=20, help='Maximum number of results')
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark build and query times')
+    bench_parser.add_argument('input_file', type=str, help='Mapped CSV or typed artifact')
+    bench_parser.add_argument('--variants', type=int, default=100000, help='Number of variants to scale up to')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        counts = build_search_index(read_mapped_catalog(args.input_file), args.index_file)
+        print(f"Search index {args.index_file}: {counts} in {time.perf_counter() - started:.3f}s")
+    elif args.command == 'query':
+        if not os.path.exists(args.index_file):
+            print(f"Error: Index file {args.index_file} does not exist")
+            sys.exit(1)
+        connection = sqlite3.connect(args.index_file)
+        try:
+            for slug, name, score in search(connection, args.text, parse_facet_arguments(args.facet),
+                                            limit=args.limit):
+                print(f"{score:8.3f}  {slug}  {name}")
+        finally:
+            connection.close()
+    else:
+        benchmark(read_mapped_catalog(args.input_file), args.variants, BENCHMARK_QUERIES)
+
+
+if __name__ == '__main__':
+    main()
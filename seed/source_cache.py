@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+CACHE_DIR = '.pim_cache'
+
+# Bumped whenever the layout of the row cache changes
+CACHE_FORMAT = 1
+
+# Rows per cached row group; a product (slug) is never split across groups
+GROUP_ROWS = 256
+
+# Keys accepted by --only, and the source column each one is read from
+ONLY_KEYS = {
+    'slug': 'slug',
+    'sku': 'sku',
+    'brand': 'product:Brand',
+}
+
+
+def cache_dir(source_file):
+    """
+    Returns the cache directory kept next to the source workbook.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(source_file)), CACHE_DIR)
+
+
+def rows_path(source_file):
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(cache_dir(source_file), f'{stem}.rows')
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_key(value):
+    if pd.isna(value):
+        return ''
+    return str(value).strip().casefold()
+
+
+def parse_only(values):
+    """
+    Parses --only arguments such as 'slug=jones-snowboard-stormchaser' or 'brand=Dupraz'.
+
+    Returns:
+        list: (key, normalized value) tuples.
+    """
+    filters = []
+    for value in values or []:
+        key, separator, wanted = value.partition('=')
+        key = key.strip().lower()
+        if not separator or key not in ONLY_KEYS or not wanted.strip():
+            raise ValueError(f"Invalid --only '{value}', expected {', '.join(f'{k}=...' for k in ONLY_KEYS)}")
+        filters.append((key, normalize_key(wanted)))
+    return filters
+
+
+def write_source_cache(source_data, source_file, digest):
+    """
+    Stores the source rows as pickled row groups, sorted by slug, together with an
+    index from slug to row range and from SKU and brand to slugs.
+
+    Args:
+        source_data (pd.DataFrame): The workbook as read by pd.read_excel, columns stripped.
+        source_file (str): Path of the workbook, which determines the cache location.
+        digest (str): Content hash of the workbook.
+
+    Returns:
+        dict: The index, as saved to index.json.
+    """
+    path = rows_path(source_file)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    # Stable sort: variants keep their workbook order within a product
+    rows = source_data.sort_values('slug', kind='stable', na_position='last').reset_index(drop=True)
+    slugs = rows['slug'].map(normalize_key).tolist()
+
+    # Row groups are pickles, which only the pandas version that wrote them is sure to read
+    index = {'format': CACHE_FORMAT, 'pandas': pd.__version__, 'hash': digest,
+             'groups': [], 'slugs': {}, 'sku': {}, 'brand': {}}
+    group_start = 0
+    position = 0
+    while position < len(rows):
+        # Advance to the end of the product, then close the group once it is full
+        product_end = position + 1
+        while product_end < len(rows) and slugs[product_end] == slugs[position]:
+            product_end += 1
+        if slugs[position]:
+            group = len(index['groups'])
+            index['slugs'][slugs[position]] = [group, position - group_start, product_end - group_start]
+        position = product_end
+        if position - group_start >= GROUP_ROWS or position == len(rows):
+            file_name = f'{len(index["groups"]):05d}.pkl'
+            rows.iloc[group_start:position].reset_index(drop=True).to_pickle(os.path.join(path, file_name))
+            index['groups'].append(file_name)
+            group_start = position
+
+    for key in ['sku', 'brand']:
+        column = ONLY_KEYS[key]
+        if column not in rows.columns:
+            continue
+        for value, slug in zip(rows[column].map(normalize_key), slugs):
+            if value and slug and slug not in index[key].setdefault(value, []):
+                index[key][value].append(slug)
+
+    with open(os.path.join(path, 'index.json'), 'w', encoding='utf-8') as handle:
+        json.dump(index, handle)
+    return index
+
+
+def load_source_index(source_file, digest):
+    """
+    Returns the cached index if it was built from the same workbook content, in the
+    current cache format and by the installed pandas version, else None.
+    """
+    try:
+        with open(os.path.join(rows_path(source_file), 'index.json'), encoding='utf-8') as handle:
+            index = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    current = {'format': CACHE_FORMAT, 'pandas': pd.__version__, 'hash': digest}
+    if not isinstance(index, dict):
+        return None
+    return index if all(index.get(key) == value for key, value in current.items()) else None
+
+
+def select_slugs(index, filters):
+    """
+    Resolves --only filters to the slugs to map. SKU and brand filters select whole
+    products, so the output can be imported on its own.
+    """
+    selected = []
+    for key, value in filters:
+        matches = [value] if key == 'slug' and value in index['slugs'] else index.get(key, {}).get(value, [])
+        if not matches:
+            print(f"Warning: No rows match --only {key}={value}")
+        selected.extend(slug for slug in matches if slug not in selected)
+    return selected
+
+
+def read_slugs(source_file, index, slugs):
+    """
+    Reads only the row groups holding the given slugs and returns their rows.
+    """
+    path = rows_path(source_file)
+    ranges = {}
+    for slug in slugs:
+        group, start, end = index['slugs'][slug]
+        ranges.setdefault(group, []).append((start, end))
+
+    parts = []
+    for group in sorted(ranges):
+        rows = pd.read_pickle(os.path.join(path, index['groups'][group]))
+        parts.extend(rows.iloc[start:end] for start, end in sorted(ranges[group]))
+    if not parts:
+        # Keep the columns so the mapping sees the same layout, just without rows
+        return pd.read_pickle(os.path.join(path, index['groups'][0])).iloc[0:0]
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_all(source_file, index):
+    path = rows_path(source_file)
+    return pd.concat([pd.read_pickle(os.path.join(path, name)) for name in index['groups']], ignore_index=True)
+
+
+def load_source(source_file, only=None):
+    """
+    Loads the source workbook through the row cache.
+
+    The workbook is only parsed when its content changed since the cache was built,
+    or when the cache cannot be read. With `only` filters (see parse_only), just the
+    row groups of the matching products are read.
+
+    Returns:
+        pd.DataFrame: Source rows with stripped column names.
+    """
+    digest = content_hash(source_file)
+    index = load_source_index(source_file, digest)
+    if index is not None:
+        try:
+            return read_slugs(source_file, index, select_slugs(index, only)) if only else read_all(source_file, index)
+        except Exception as e:
+            # e.g. a missing or truncated row group; the workbook is still there to rebuild from
+            print(f"Warning: Could not read the source row cache, rebuilding it: {e!r}")
+
+    source_data = pd.read_excel(source_file)
+    source_data.columns = source_data.columns.str.strip()
+    try:
+        index = write_source_cache(source_data, source_file, digest)
+        print(f"Source row cache written to {rows_path(source_file)}")
+    except OSError as e:
+        if only:
+            raise
+        print(f"Warning: Could not write the source row cache: {e}")
+    return read_slugs(source_file, index, select_slugs(index, only)) if only else source_data
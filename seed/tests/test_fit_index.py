@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from fit_index import (FLAG_LENGTH_INVERTED, FLAG_WEIGHT_COPIED, FLAG_WEIGHT_EMPTY, FitIndex, build_fit_index,
+                       range_flags, synthetic_columns)
+
+QUERY_SHAPES = ['hwb', 'hw', 'hb', 'wb', 'h', 'w', 'b', '']
+
+
+@pytest.fixture(scope='module')
+def fit_index(tmp_path_factory):
+    skus, columns = synthetic_columns(20000, seed=3)
+    rng = np.random.default_rng(4)
+    # Boot length maxima that are missing, and ranges that the index flags and opens up
+    columns['variant:bootLengthMax'][rng.random(len(skus)) < 0.05] = np.nan
+    copied = rng.random(len(skus)) < 0.02
+    columns['variant:riderWeightMin'][copied] = columns['variant:riderLengthMin'][copied]
+    columns['variant:riderWeightMax'][copied] = columns['variant:riderLengthMax'][copied]
+    inverted = rng.random(len(skus)) < 0.02
+    columns['variant:riderLengthMin'][inverted] = columns['variant:riderLengthMax'][inverted] + 5
+
+    path = tmp_path_factory.mktemp('fit') / 'fit.idx'
+    flags = build_fit_index(skus, columns, str(path))
+    index = FitIndex(str(path))
+    positions = {index.sku(position): position for position in range(index.count)}
+    return index, positions, flags
+
+
+def riders(shape, count, seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        # Wider than the synthetic ranges, so some riders fit nothing or only open ranges
+        yield (float(rng.uniform(130, 215)) if 'h' in shape else None,
+               float(rng.uniform(30, 125)) if 'w' in shape else None,
+               float(rng.uniform(23, 35)) if 'b' in shape else None)
+
+
+@pytest.mark.parametrize('shape', QUERY_SHAPES)
+@pytest.mark.parametrize('limit', [1, 20, 300])
+def test_query_matches_full_scan(fit_index, shape, limit):
+    index, positions, _ = fit_index
+    for height, weight, boot_length in riders(shape, 40, seed=limit):
+        fitting, scores = index._score(np.arange(index.count), height, weight, boot_length)
+        expected = np.sort(scores)[::-1][:limit]
+        brute_force = dict(zip(fitting.tolist(), scores.tolist()))
+
+        results = index.query(height, weight, boot_length, limit)
+
+        found = [positions[sku] for sku, _ in results]
+        assert len(set(found)) == len(found)
+        assert [score for _, score in results] == expected.tolist()
+        assert [brute_force[position] for position in found] == expected.tolist()
+
+
+def test_flags_unusable_ranges(fit_index):
+    index, _, flags = fit_index
+    assert (flags & FLAG_WEIGHT_COPIED).any()
+    assert (flags & FLAG_LENGTH_INVERTED).any()
+    # Flagged ranges are opened up, so they never exclude a rider
+    flagged = index.flags & FLAG_LENGTH_INVERTED > 0
+    assert np.isinf(index.length_min[flagged]).all() and np.isinf(index.length_max[flagged]).all()
+
+
+def test_copied_weight_range_is_only_flagged_as_copied():
+    # map_pim's mapping bug copies the rider length maximum into both weight bounds
+    length_min, length_max = np.array([150.0, 150.0, 150.0]), np.array([170.0, 170.0, 170.0])
+    weight_min, weight_max = np.array([170.0, 150.0, 60.0]), np.array([170.0, 170.0, 60.0])
+    stance = np.full(3, np.nan)
+
+    flags = range_flags(length_min, length_max, weight_min, weight_max, stance, stance)
+
+    assert flags.tolist() == [FLAG_WEIGHT_COPIED, FLAG_WEIGHT_COPIED, FLAG_WEIGHT_EMPTY]
+
+
+@pytest.mark.parametrize('height, weight', [(180, 75), (180, None)])
+def test_declared_ranges_outrank_unknown_ones(tmp_path, height, weight):
+    # The board without ranges has the better boot length maximum, and the second
+    # board only declares a rider length range, with the rider off its centre
+    columns = {
+        'variant:riderLengthMin': np.array([170, 160, np.nan]),
+        'variant:riderLengthMax': np.array([190, 190, np.nan]),
+        'variant:riderWeightMin': np.array([60, np.nan, np.nan]),
+        'variant:riderWeightMax': np.array([90, np.nan, np.nan]),
+        'variant:bootLengthMax': np.array([30.0, 30.0, 29.5]),
+    }
+    path = tmp_path / 'fit.idx'
+    build_fit_index(['ranged', 'length-only', 'unranged'], columns, str(path))
+
+    results = FitIndex(str(path)).query(height, weight, 29, limit=3)
+
+    assert [sku for sku, _ in results] == ['ranged', 'length-only', 'unranged']
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'fit.idx'
+    path.write_bytes(b'FITIDX02' + bytes(64))
+    with pytest.raises(ValueError):
+        FitIndex(str(path))
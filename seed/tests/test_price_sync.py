@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from map_pim import commit_price_stock_state, convert_source_to_products, update_prices_and_stock
+from price_sync import load_state, state_path
+from quality_rules import ERROR, OK
+
+
+def write_workbook(path, prices):
+    pd.DataFrame({
+        'slug': ['abc', 'numeric', 'def'],
+        'sku': ['ABC', 12345, 'DEF'],
+        'name': ['Abc', 'Numeric', 'Def'],
+        'price': prices,
+    }).to_excel(path, index=False)
+
+
+def changed_skus(workbook, output):
+    assert update_prices_and_stock(str(workbook), str(output)) == OK
+    return pd.read_csv(output, dtype=str)['sku'].tolist()
+
+
+@pytest.fixture
+def imported(tmp_path):
+    # A workbook whose full run was imported into Vendure
+    workbook = tmp_path / 'w.xlsx'
+    write_workbook(workbook, [10, 20.5, 30])
+    convert_source_to_products(str(workbook), str(tmp_path / 'mapped.csv'))
+    assert commit_price_stock_state(str(workbook)) == OK
+    return workbook
+
+
+def test_price_stock_run_after_full_run_finds_no_changes(imported, tmp_path):
+    assert changed_skus(imported, tmp_path / 'update.csv') == []
+    assert sorted(load_state(state_path(str(imported))).index) == ['12345', 'ABC', 'DEF']
+
+
+def test_changes_are_written_until_committed(imported, tmp_path):
+    write_workbook(imported, [10, 21.5, 30])
+
+    assert changed_skus(imported, tmp_path / 'update.csv') == ['12345']
+    # The update was never imported, so the next run still writes it
+    assert changed_skus(imported, tmp_path / 'update.csv') == ['12345']
+
+    assert commit_price_stock_state(str(imported)) == OK
+    assert changed_skus(imported, tmp_path / 'update.csv') == []
+    assert commit_price_stock_state(str(imported)) == ERROR
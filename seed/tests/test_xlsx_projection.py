@@ -0,0 +1,46 @@
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+
+from xlsx_projection import read_columns
+
+COLUMNS = ['slug', 'sku', 'price', 'stockOnHand']
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'w.xlsx'
+    pd.DataFrame({
+        'slug': ['abc', 'numeric', 'def'],
+        'sku': ['ABC', 12345, 'DEF'],
+        'name': ['Abc', 'Numeric', 'Def'],
+        'price': [10, 20.5, 30],
+        'stockOnHand': [1, None, 3],
+    }).to_excel(path, index=False)
+    return path
+
+
+def test_read_columns_matches_read_excel(workbook):
+    expected = pd.read_excel(workbook)[COLUMNS]
+
+    projected = read_columns(str(workbook), COLUMNS)
+
+    pd.testing.assert_frame_equal(projected, expected)
+    # As text, which is how price_sync compares SKUs, and never '12345.0'
+    assert projected['sku'].astype('string').tolist() == ['ABC', '12345', 'DEF']
+
+
+def test_read_columns_without_cell_references(workbook, tmp_path):
+    # Cell references are optional; without them cells follow each other within a row
+    path = tmp_path / 'unreferenced.xlsx'
+    with zipfile.ZipFile(workbook) as source, zipfile.ZipFile(path, 'w') as target:
+        for item in source.infolist():
+            data = source.read(item)
+            if item.filename.startswith('xl/worksheets/'):
+                data = re.sub(rb'(<c[^>]*?) r="[A-Z]+[0-9]+"', rb'\1', data)
+            target.writestr(item, data)
+
+    pd.testing.assert_frame_equal(read_columns(str(path), COLUMNS), pd.read_excel(path)[COLUMNS])
+    assert read_columns(str(path), COLUMNS)['slug'].tolist() == ['abc', 'numeric', 'def']
@@ -0,0 +1,144 @@
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+import pandas as pd
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def column_number(reference):
+    """
+    Returns the zero-based column of a cell reference such as 'CQ12'.
+    """
+    number = 0
+    for character in reference:
+        if character.isdigit():
+            break
+        number = number * 26 + ord(character.upper()) - 64
+    return number - 1
+
+
+def first_sheet_path(archive):
+    """
+    Returns the archive path of the first worksheet, which is what pd.read_excel reads by default.
+    """
+    with archive.open('xl/workbook.xml') as handle:
+        sheet = next(element for _, element in iterparse(handle) if element.tag == MAIN_NS + 'sheet')
+        relationship_id = sheet.get(RELATIONSHIP_NS + 'id')
+    with archive.open('xl/_rels/workbook.xml.rels') as handle:
+        for _, element in iterparse(handle):
+            if element.tag == PACKAGE_NS + 'Relationship' and element.get('Id') == relationship_id:
+                target = element.get('Target')
+                return target.lstrip('/') if target.startswith('/') else posixpath.normpath('xl/' + target)
+    raise ValueError(f"Worksheet {relationship_id} not found in workbook relationships")
+
+
+def shared_strings(archive):
+    """
+    Returns the shared string table of the workbook.
+    """
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as handle:
+        for _, element in iterparse(handle):
+            if element.tag == MAIN_NS + 'si':
+                strings.append(''.join(text.text or '' for text in element.iter(MAIN_NS + 't')))
+                element.clear()
+    return strings
+
+
+def number_value(text):
+    """
+    Returns a numeric cell value the way pd.read_excel does: whole numbers as int,
+    others as float. Integers are parsed exactly, as openpyxl does.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+def cell_value(cell, strings):
+    """
+    Returns the value of a cell the way pd.read_excel does: whole numbers as int,
+    other numbers as float, text as str, booleans as bool and empty or error cells as None.
+    """
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(text.text or '' for text in cell.iter(MAIN_NS + 't'))
+    value = cell.find(MAIN_NS + 'v')
+    if value is None or value.text is None or kind == 'e':
+        return None
+    if kind == 's':
+        return strings[int(value.text)]
+    if kind == 'str':
+        return value.text
+    if kind == 'b':
+        return value.text == '1'
+    return number_value(value.text)
+
+
+def read_columns(path, columns):
+    """
+    Reads only the given columns of the first worksheet of an .xlsx workbook.
+
+    The sheet XML is streamed and cells outside the requested columns are skipped
+    without being converted, so the heavy description columns are never materialised.
+    Header names are matched after stripping surrounding whitespace, like map_pim does.
+    Cells without a reference (the 'r' attribute is optional) follow the previous cell of their row.
+
+    Args:
+        path (str): Path to the .xlsx workbook.
+        columns (list): Header names to read.
+
+    Returns:
+        pd.DataFrame: The requested columns that exist in the sheet, in the requested
+        order. Empty cells are NaN and rows that are empty in all requested columns are dropped.
+    """
+    wanted = set(columns)
+    with zipfile.ZipFile(path) as archive:
+        strings = shared_strings(archive)
+        positions = None    # column number -> header name, once the header row is read
+        header = {}
+        records = []
+        row = {}
+        number = -1    # column of the last cell read in the current row
+        with archive.open(first_sheet_path(archive)) as handle:
+            for _, element in iterparse(handle):
+                if element.tag == MAIN_NS + 'c':
+                    reference = element.get('r')
+                    number = column_number(reference) if reference else number + 1
+                    if positions is None:
+                        header[number] = cell_value(element, strings)
+                    elif number in positions:
+                        value = cell_value(element, strings)
+                        if value is not None:
+                            row[positions[number]] = value
+                    element.clear()
+                elif element.tag == MAIN_NS + 'row':
+                    number = -1
+                    if positions is None:
+                        positions = {}
+                        for column, name in sorted(header.items()):
+                            name = '' if name is None else str(name).strip()
+                            if name in wanted and name not in positions.values():
+                                positions[column] = name
+                    elif row:
+                        records.append(row)
+                        row = {}
+                    element.clear()
+
+    found = set(positions.values()) if positions else set()
+    frame = pd.DataFrame.from_records(records, columns=[name for name in columns if name in found])
+    for name in frame.columns:
+        # pd.read_excel turns columns of numbers stored as text into numbers, and so do we
+        try:
+            frame[name] = pd.to_numeric(frame[name])
+        except (ValueError, TypeError):
+            pass
+    return frame